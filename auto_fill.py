@@ -2,30 +2,112 @@
 纪念钞预约系统 - 独立自动填写程序
 连接到你已经打开的浏览器，直接操作当前页面
 不会重新加载页面，速度极快
+
+无头回归模式（不需要手动打开浏览器）:
+    python auto_fill.py --headless "fixtures/mock_reservation.html?bank=abc" --runs 5 --json -
 """
 
+import os
+import sys
 import json
 import time
 import asyncio
-from playwright.async_api import async_playwright
+import argparse
+import contextlib
+from pathlib import Path
+from urllib.parse import urlparse
+from browser_pool import BrowserPool, BASE_PORT
+from dom_wait import resolve_timeout, wait_for_form_ready
+from timing import FillTimeline
+from config_store import read_config
+from page_scripts import SCRIPTS
+
+# 页面内批量匹配并填写文本字段：按选择器优先级为每个字段找第一个可见、可编辑、
+# 未被其他字段占用的输入框，全部确定后再一并写入
+SMART_FILL_JS = r'''(fields) => {
+    const isVisible = el => !!el && el.offsetWidth > 0 && el.offsetHeight > 0;
+    const editable = el => !el.readOnly && !el.disabled && el.type !== 'hidden';
+    const claimed = new Set();
+    const matches = [];
+    const report = { fields: {}, select_count: document.querySelectorAll('select').length };
+
+    for (const field of fields) {
+        let match = null;
+        for (const selector of field.selectors) {
+            let candidates;
+            try {
+                candidates = document.querySelectorAll(selector);
+            } catch (e) {
+                continue;
+            }
+            match = Array.from(candidates).find(el => !claimed.has(el) && editable(el) && isVisible(el))
+                || Array.from(candidates).find(el => !claimed.has(el) && editable(el));
+            if (match) {
+                claimed.add(match);
+                matches.push({ field: field, el: match, selector: selector });
+                break;
+            }
+        }
+        if (!match) report.fields[field.key] = { ok: false, error: '未找到输入框' };
+    }
+
+    for (const { field, el, selector } of matches) {
+        el.focus();
+        el.value = field.value;
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+        el.dispatchEvent(new Event('blur', { bubbles: true }));
+        const ok = el.value === field.value;
+        report.fields[field.key] = ok
+            ? { ok: true, selector: selector, value: field.value }
+            : { ok: false, selector: selector, error: '写入后值不一致' };
+    }
+    // 按传入顺序返回各字段结果
+    const ordered = {};
+    for (const field of fields) ordered[field.key] = report.fields[field.key];
+    report.fields = ordered;
+    return report;
+}'''
+SMART_FILL = SCRIPTS.register("smart_fill", SMART_FILL_JS)
+
+
+def resolve_target(target):
+    """无头模式的目标地址：本地文件路径（可带 ?查询参数）转为 file:// 地址，其他原样返回"""
+    path, sep, query = target.partition('?')
+    if os.path.exists(path):
+        return Path(path).resolve().as_uri() + sep + query
+    return target
+
 
 class BrowserConnector:
     """连接到已打开的浏览器并自动填写"""
     
     def __init__(self, config_path="config.json"):
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        # 读取时已把旧版单个 user_info 迁移为 user_infos 列表
+        self.config = read_config(config_path)
         self.browser = None
         self.page = None
+        self.pool = None
+        self.timeline = None
+        
+    def current_user(self):
+        """当前选中的身份信息"""
+        user_infos = self.config['user_infos']
+        if not user_infos:
+            raise ValueError("配置中没有身份信息，请先在图形界面中添加")
+        index = self.config['selected_user_index']
+        return user_infos[index] if 0 <= index < len(user_infos) else user_infos[0]
         
     async def connect_to_browser(self, cdp_url="http://localhost:9222"):
         """连接到已经打开的浏览器"""
         print(f"🔗 正在连接到浏览器: {cdp_url}")
         
-        playwright = await async_playwright().start()
+        endpoint = urlparse(cdp_url)
+        if self.pool is None:
+            self.pool = BrowserPool(host=endpoint.hostname or "localhost")
         try:
             # 连接到已运行的浏览器
-            self.browser = await playwright.chromium.connect_over_cdp(cdp_url)
+            self.browser = await self.pool.connect(endpoint.port or BASE_PORT)
             
             # 获取所有打开的页面
             contexts = self.browser.contexts
@@ -51,86 +133,100 @@ class BrowserConnector:
             return False
     
     async def fill_form_ultra_fast(self):
-        """超高速填写表单"""
+        """超高速填写表单，返回结果报告（各字段是否填写成功、每一步耗时、失败项）"""
         if not self.page:
             print("❌ 未连接到页面")
-            return
+            return {"success": False, "fields": {}, "steps": [], "failures": ["未连接到页面"],
+                    "not_applicable": [], "total_ms": 0}
             
         start_time = time.time()
         print("\n⚡ 开始超高速填写...")
         
-        user_info = self.config['user_info']
+        user_info = self.current_user()
+        self.timeline = timeline = FillTimeline(user_info.get('name', ''))
+        fields = {}
+        failures = []
+        not_applicable = []  # 页面上不存在、无需填写的字段
         
         try:
-            # 并发填写所有文本字段
-            await asyncio.gather(
-                # 姓名
-                self.smart_fill(
-                    ['input[name*="name" i]', 'input[placeholder*="姓名" i]'],
-                    user_info['name']
-                ),
-                
-                # 证件号码
-                self.smart_fill(
-                    ['input[name*="id" i]', 'input[placeholder*="证件" i]', 'input[placeholder*="身份证" i]'],
-                    user_info['id_number']
-                ),
-                
-                # 手机号
-                self.smart_fill(
-                    ['input[name*="phone" i]', 'input[name*="mobile" i]', 'input[placeholder*="手机" i]'],
-                    user_info['phone']
-                ),
-                
-                # 数量
-                self.smart_fill(
-                    ['input[type="number"]', 'input[name*="quantity" i]', 'input[placeholder*="数量" i]'],
-                    str(self.config['quantity'])
-                ),
-                
-                return_exceptions=True
-            )
-            
-            # 选择证件类型
-            try:
-                await self.page.select_option('select', user_info['id_type'])
-                print(f"  ✅ 证件类型: {user_info['id_type']}")
-            except:
-                pass
+            # 所有文本字段一次 evaluate 完成匹配和填写
+            with timeline.span("文本字段"):
+                report = await self.smart_fill([
+                    {"key": "name", "label": "姓名", "value": user_info['name'],
+                     "selectors": ['input[name*="name" i]', 'input[placeholder*="姓名" i]']},
+                    {"key": "id_number", "label": "证件号码", "value": user_info['id_number'],
+                     "selectors": ['input[name*="id" i]', 'input[placeholder*="证件" i]', 'input[placeholder*="身份证" i]']},
+                    {"key": "phone", "label": "手机号", "value": user_info['phone'],
+                     "selectors": ['input[name*="phone" i]', 'input[name*="mobile" i]', 'input[placeholder*="手机" i]']},
+                    {"key": "quantity", "label": "数量", "value": str(self.config['quantity']),
+                     "selectors": ['input[type="number"]', 'input[name*="quantity" i]', 'input[placeholder*="数量" i]']},
+                ])
+            for key, field in report["fields"].items():
+                fields[key] = field["ok"]
+                if not field["ok"]:
+                    failures.append(f"{key}: {field.get('error', '未找到输入框')}")
+            has_select = report["select_count"] > 0
             
-            # 选择兑换网点
+            # 证件类型和兑换网点只支持原生 select；页面没有原生下拉框（如 Element UI 页面）时
+            # 记为不适用，不算失败，也不等待超时
             location = self.config['exchange_location']
-            try:
-                # 点击下拉框
-                await self.page.click('select', timeout=1000)
-                # 选择包含关键词的选项
-                await self.page.select_option('select', label=location['name'])
-                print(f"  ✅ 兑换网点: {location['name']}")
-            except Exception as e:
-                print(f"  ⚠️ 网点选择失败: {e}")
+            select_steps = [
+                ("id_type", "证件类型", user_info['id_type'], {"value": user_info['id_type']}),
+                ("exchange_location", "兑换网点", location['name'], {"label": location['name']}),
+            ]
+            for key, label, text, option in select_steps:
+                with timeline.span(label) as span:
+                    if not has_select:
+                        span["detail"] = {"skipped": "页面没有原生 select 下拉框"}
+                        not_applicable.append(key)
+                        print(f"  ℹ️ {label}: 页面没有原生下拉框，跳过")
+                        continue
+                    try:
+                        await self.page.select_option('select', **option, timeout=1000)
+                        print(f"  ✅ {label}: {text}")
+                    except Exception as e:
+                        span["ok"] = False
+                        failures.append(f"{key}: {e}")
+                        print(f"  ⚠️ {label}选择失败: {e}")
+                    fields[key] = span["ok"]
             
             elapsed = time.time() - start_time
             print(f"\n✅ 填写完成! 耗时: {elapsed:.3f} 秒")
+            for span in timeline.spans:
+                mark = "ℹ️" if "skipped" in span.get("detail", {}) else "✅" if span["ok"] else "⚠️"
+                print(f"   {mark} {span['name']}: {span['duration_ms']:.0f}ms")
             print("💡 请检查验证码并手动输入，然后点击提交\n")
             
         except Exception as e:
+            failures.append(str(e))
             print(f"\n❌ 填写失败: {e}")
             import traceback
             traceback.print_exc()
+        
+        return {
+            "url": self.page.url,
+            "user": user_info.get('name', ''),
+            "success": not failures,
+            "fields": fields,
+            "steps": list(timeline.spans),
+            "failures": failures,
+            "not_applicable": not_applicable,
+            "total_ms": round(timeline.total_ms(), 1),
+        }
     
-    async def smart_fill(self, selectors, value):
-        """智能填写 - 尝试多个选择器"""
-        for selector in selectors:
-            try:
-                element = await self.page.query_selector(selector)
-                if element:
-                    await element.fill(value)
-                    field_name = selector.split('[')[1].split('*=')[1].strip('"')
-                    print(f"  ✅ {field_name}: {value}")
-                    return True
-            except:
-                continue
-        return False
+    async def smart_fill(self, fields):
+        """智能填写 - 所有字段的候选选择器一次发送到页面，逐字段取最佳匹配后一并填写
+
+        fields 为 [{"key", "label", "value", "selectors"}]，返回页面例程的报告
+        """
+        report = await SCRIPTS.call(self.page, SMART_FILL, fields)
+        labels = {field["key"]: field["label"] for field in fields}
+        for key, field in report["fields"].items():
+            if field["ok"]:
+                print(f"  ✅ {labels[key]}: {field['value']} ({field['selector']})")
+            else:
+                print(f"  ⚠️ {labels[key]}: {field.get('error', '未找到输入框')}")
+        return report
     
     async def show_all_inputs(self):
         """显示页面所有输入框（调试用）"""
@@ -151,13 +247,15 @@ class BrowserConnector:
 ╚════════════════════════════════════════╝
         """)
         
-        print(f"📋 用户: {self.config['user_info']['name']}")
-        print(f"📞 手机: {self.config['user_info']['phone']}")
+        user_info = self.current_user()
+        print(f"📋 用户: {user_info['name']}")
+        print(f"📞 手机: {user_info['phone']}")
         print(f"🏦 网点: {self.config['exchange_location']['name']}\n")
         
         # 连接到浏览器
         success = await self.connect_to_browser()
         if not success:
+            await self.close()
             return
         
         # 执行填写
@@ -169,10 +267,81 @@ class BrowserConnector:
             await asyncio.sleep(300)  # 等待5分钟
         except KeyboardInterrupt:
             print("\n👋 程序已停止")
+        finally:
+            await self.close()
+    
+    async def run_headless(self, target, runs=1):
+        """无头回归模式：本地启动 Chromium 打开目标页面执行填写，返回每一次的结果报告"""
+        url = resolve_target(target)
+        timeout_ms = resolve_timeout(self.config)
+        if self.pool is None:
+            self.pool = BrowserPool()
+        reports = []
+        try:
+            browser = await self.pool.launch(headless=True)
+            self.page = await browser.new_page()
+            self.page.set_default_timeout(timeout_ms)
+            for run in range(runs):
+                await self.page.goto(url)
+                await wait_for_form_ready(self.page, timeout_ms)
+                report = await self.fill_form_ultra_fast()
+                report["run"] = run
+                reports.append(report)
+        finally:
+            await self.close()
+        return reports
+    
+    async def close(self):
+        """断开连接并停止 Playwright 驱动"""
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+def run_headless_main(args):
+    """无头回归模式入口，返回退出码：全部成功为 0，否则为 1"""
+    connector = BrowserConnector(args.config)
+    # 结果输出到标准输出时，过程日志改写到标准错误，保证标准输出是纯 JSON
+    log_stream = sys.stderr if args.json == "-" else sys.stdout
+    error = None
+    with contextlib.redirect_stdout(log_stream):
+        try:
+            reports = asyncio.run(connector.run_headless(args.headless, runs=args.runs))
+        except Exception as e:
+            reports, error = [], str(e)
+            print(f"❌ 无头模式运行失败: {e}")
+    result = {
+        "target": args.headless,
+        "runs": len(reports),
+        "success": error is None and bool(reports) and all(r["success"] for r in reports),
+        "results": reports,
+    }
+    if error:
+        result["error"] = error
+    if args.json == "-":
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存: {args.json}")
+    return 0 if result["success"] else 1
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="纪念钞预约 - 独立自动填写程序")
+    parser.add_argument("--config", default="config.json", help="配置文件路径")
+    parser.add_argument("--headless", metavar="URL",
+                        help="无头回归模式：本地启动 Chromium 打开该地址或本地文件后填写，例如 "
+                             "fixtures/mock_reservation.html?bank=abc")
+    parser.add_argument("--runs", type=int, default=1, help="无头模式重复运行次数（每次重新加载页面）")
+    parser.add_argument("--json", metavar="PATH", help="无头模式结果写入 JSON 文件，- 表示输出到标准输出")
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    if args.headless:
+        sys.exit(run_headless_main(args))
     try:
-        connector = BrowserConnector()
+        connector = BrowserConnector(args.config)
         asyncio.run(connector.run())
     except KeyboardInterrupt:
         print("\n\n👋 程序已手动停止")
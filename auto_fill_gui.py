@@ -1,17 +1,43 @@
 """
 纪念钞预约系统 - 图形界面版本
 简洁美观的GUI，支持多身份信息配置，一键配置和执行
+
+    python auto_fill_gui.py --startup-time   # 测量启动各阶段耗时后退出
 """
 
-import json
+import time
+STARTED_AT = time.perf_counter()
+
+import sys
 import asyncio
+import argparse
+import threading
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 from threading import Thread
-from playwright.async_api import async_playwright
-import subprocess
-import os
-import tempfile
+from datetime import date
+from fill_engine import perform_fill, format_fill_report, resolve_fill_options
+from dom_wait import resolve_timeout, wait_for_form_ready
+from log_sink import LogSink, DEFAULT_MAX_LINES
+from session import SessionOrchestrator
+from browser_pool import BASE_PORT, BrowserPool, ConnectionManager
+from launcher import BrowserLauncher
+from timing import FillTimeline, TimingRecorder
+from locator import FieldLocator
+from profiles import ProfileDetector
+from option_tree import OptionTreeCache
+from outlet_catalog import OutletCatalog, load_pinyin
+from config_store import ConfigStore, assign_identity
+from status_bus import StatusBus, StatusFileWriter, latest_by_user
+from net_timing import NetworkCollector, format_network_summary
+
+# 后台连接状态对应的显示文本
+CONNECTION_STATUS = {
+    'connecting': '🔗 连接中...',
+    'connected': '✅ 已连接',
+    'offline': '⚪ 未连接',
+    'reconnecting': '🔄 重连中...',
+}
 
 class UserInfoEditorDialog(tk.Toplevel):
     """身份信息编辑对话框"""
@@ -88,15 +114,17 @@ class UserInfoEditorDialog(tk.Toplevel):
         self.destroy()
 
 class LocationEditorDialog(tk.Toplevel):
-    """网点信息编辑对话框"""
-    def __init__(self, parent, bank_type, initial_data=None):
+    """网点信息编辑对话框，有网点目录时提供搜索和逐级补全"""
+    def __init__(self, parent, bank_type, initial_data=None, catalog=None):
         super().__init__(parent)
         self.title(f"编辑网点信息 - {bank_type}")
-        self.geometry("450x400")
+        self.catalog = catalog if catalog is not None and len(catalog) else None
+        self.geometry("480x560" if self.catalog else "450x400")
         self.resizable(False, False)
         self.parent = parent
         self.bank_type = bank_type
         self.result = None
+        self.level_keys = []  # 按层级顺序排列的输入框键
         
         self.transient(parent)
         self.grab_set()
@@ -119,6 +147,9 @@ class LocationEditorDialog(tk.Toplevel):
         
         self.entries = {}
         
+        if self.catalog:
+            self.create_search(main_frame)
+        
         if self.bank_type == "农业银行":
             # 级联路经编辑
             labels = ["省分行", "市分行", "支行", "营业室"]
@@ -132,10 +163,11 @@ class LocationEditorDialog(tk.Toplevel):
                 row = tk.Frame(main_frame)
                 row.pack(fill=tk.X, pady=5)
                 tk.Label(row, text=f"{label}:", width=10, anchor=tk.W).pack(side=tk.LEFT)
-                entry = tk.Entry(row)
+                entry = self.create_level_entry(row, len(self.level_keys))
                 entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
                 entry.insert(0, current_values[i])
                 self.entries[f"level_{i}"] = entry
+                self.level_keys.append(f"level_{i}")
                 
         else: # 工商银行
             # 独立字段编辑
@@ -153,10 +185,11 @@ class LocationEditorDialog(tk.Toplevel):
                 row = tk.Frame(main_frame)
                 row.pack(fill=tk.X, pady=5)
                 tk.Label(row, text=f"{label}:", width=10, anchor=tk.W).pack(side=tk.LEFT)
-                entry = tk.Entry(row)
+                entry = self.create_level_entry(row, len(self.level_keys))
                 entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
                 entry.insert(0, icbc_data.get(key, ''))
                 self.entries[key] = entry
+                self.level_keys.append(key)
                 
         # 按钮区域
         btn_frame = tk.Frame(self)
@@ -164,8 +197,70 @@ class LocationEditorDialog(tk.Toplevel):
         
         tk.Button(btn_frame, text="取消", command=self.destroy, width=10).pack(side=tk.RIGHT, padx=20)
         tk.Button(btn_frame, text="确定", command=self.on_ok, width=10, bg="#0078d4", fg="white").pack(side=tk.RIGHT)
+    
+    def create_search(self, parent):
+        """网点搜索：输入网点名称、上级名称或拼音首字母，选中后填入全部层级"""
+        tk.Label(parent, text=f"搜索网点（目录共 {len(self.catalog)} 个，可输入拼音首字母）：",
+                 font=("微软雅黑", 10, "bold")).pack(anchor=tk.W)
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(parent, textvariable=self.search_var)
+        search_entry.pack(fill=tk.X, pady=(5, 5))
+        search_entry.bind('<KeyRelease>', lambda e: self.refresh_search())
+        
+        self.search_list = tk.Listbox(parent, height=6)
+        self.search_list.pack(fill=tk.X, pady=(0, 10))
+        self.search_list.bind('<<ListboxSelect>>', self.on_search_select)
+        self.search_results = []
+        self.refresh_search()
+    
+    def refresh_search(self):
+        self.search_results = self.catalog.search(self.search_var.get())
+        self.search_list.delete(0, tk.END)
+        for path in self.search_results:
+            self.search_list.insert(tk.END, " / ".join(path))
+    
+    def on_search_select(self, event):
+        selection = self.search_list.curselection()
+        if not selection:
+            return
+        path = self.search_results[selection[0]]
+        for key, value in zip(self.level_keys, path):
+            self.entries[key].delete(0, tk.END)
+            self.entries[key].insert(0, value)
+    
+    def create_level_entry(self, parent, level):
+        """有目录时用下拉框，选项为上级已选值下的已知选项，输入时按前缀/首字母过滤"""
+        if not self.catalog:
+            return tk.Entry(parent)
+        entry = ttk.Combobox(parent, postcommand=lambda: self.refresh_level(level))
+        entry.bind('<KeyRelease>', lambda e: self.refresh_level(level, entry.get()))
+        return entry
+    
+    def level_prefix(self, level):
+        return tuple(self.entries[key].get().strip() for key in self.level_keys[:level])
+    
+    def refresh_level(self, level, query=""):
+        entry = self.entries[self.level_keys[level]]
+        entry['values'] = self.catalog.filter_options(self.level_prefix(level), query)
+    
+    def unknown_levels(self):
+        """目录中已知该层级的选项、但填写值不在其中的层级"""
+        unknown = []
+        for level, key in enumerate(self.level_keys):
+            value = self.entries[key].get().strip()
+            known = self.catalog.options(self.level_prefix(level))
+            if value and known and value not in known:
+                unknown.append(value)
+        return unknown
         
     def on_ok(self):
+        if self.catalog:
+            unknown = self.unknown_levels()
+            if unknown and not messagebox.askyesno(
+                "确认", f"以下名称不在已知网点目录中：\n{', '.join(unknown)}\n\n仍然保存？", parent=self
+            ):
+                return
+        
         if self.bank_type == "农业银行":
             path = []
             for i in range(4):
@@ -197,8 +292,115 @@ class LocationEditorDialog(tk.Toplevel):
             }
         self.destroy()
 
+class UserListView:
+    """用户列表视图模型：行 iid 为用户编号，同步时只增删/更新/移动有变化的行"""
+    def __init__(self, tree):
+        self.tree = tree
+        self.rows = {}  # {user_id: (显示名称, 状态)}
+    
+    @staticmethod
+    def display_name(user):
+        return f"👤 {user.get('name', '未命名')} - {user.get('id_number', '')}"
+    
+    def sync(self, users, statuses):
+        """按用户列表顺序同步所有行"""
+        user_ids = {user["id"] for user in users}
+        for user_id in [uid for uid in self.rows if uid not in user_ids]:
+            self.tree.delete(user_id)
+            del self.rows[user_id]
+        
+        for position, user in enumerate(users):
+            user_id = user["id"]
+            values = (self.display_name(user), statuses.get(user_id, '⚪ 未连接'))
+            if user_id not in self.rows:
+                self.tree.insert('', position, iid=user_id, values=values)
+            else:
+                if self.rows[user_id] != values:
+                    self.tree.item(user_id, values=values)
+                if self.tree.index(user_id) != position:
+                    self.tree.move(user_id, '', position)
+            self.rows[user_id] = values
+    
+    def set_status(self, user_id, status):
+        """只更新一个用户的状态单元格，状态未变化时不触碰界面"""
+        values = self.rows.get(user_id)
+        if values is None or values[1] == status:
+            return
+        values = (values[0], status)
+        self.tree.item(user_id, values=values)
+        self.rows[user_id] = values
+
+class TimingPanelDialog(tk.Toplevel):
+    """耗时分析面板，订阅状态总线后在用户状态变化时自动刷新"""
+    def __init__(self, parent, recorder, status_bus=None):
+        super().__init__(parent)
+        self.title("⏱️ 耗时分析")
+        self.geometry("560x420")
+        self.recorder = recorder
+        self.unsubscribe = status_bus.subscribe(lambda events: self.refresh()) if status_bus else None
+        
+        self.transient(parent)
+        self.create_widgets()
+        self.refresh()
+        self.bind('<Destroy>', self.on_destroy)
+    
+    def on_destroy(self, event):
+        if event.widget is self and self.unsubscribe:
+            self.unsubscribe()
+            self.unsubscribe = None
+        
+    def create_widgets(self):
+        columns = ('source', 'start', 'duration', 'bar')
+        self.tree = ttk.Treeview(self, columns=columns, show='tree headings')
+        self.tree.heading('#0', text='阶段')
+        self.tree.heading('source', text='来源')
+        self.tree.heading('start', text='开始(ms)')
+        self.tree.heading('duration', text='耗时(ms)')
+        self.tree.heading('bar', text='')
+        self.tree.column('#0', width=180)
+        self.tree.column('source', width=60, anchor=tk.CENTER)
+        self.tree.column('start', width=70, anchor=tk.E)
+        self.tree.column('duration', width=70, anchor=tk.E)
+        self.tree.column('bar', width=160)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        btn_frame = tk.Frame(self)
+        btn_frame.pack(fill=tk.X, pady=(0, 10))
+        tk.Button(btn_frame, text="关闭", command=self.destroy, width=10).pack(side=tk.RIGHT, padx=10)
+        tk.Button(btn_frame, text="💾 导出JSON", command=self.export_json, width=12).pack(side=tk.RIGHT)
+        tk.Button(btn_frame, text="🔄 刷新", command=self.refresh, width=10).pack(side=tk.RIGHT, padx=10)
+        
+    def refresh(self):
+        for item in self.tree.get_children():
+            self.tree.delete(item)
+        
+        for timeline in self.recorder.snapshot().values():
+            total = timeline['total_ms'] or 1
+            parent = self.tree.insert('', tk.END, text=f"👤 {timeline['user']}", open=True,
+                                      values=('', timeline['started_at'][11:], f"{timeline['total_ms']:.0f}", ''))
+            for span in timeline['spans']:
+                mark = '' if span['ok'] else '❌ '
+                bar = '█' * max(1, int(span['duration_ms'] / total * 20)) if span['duration_ms'] else ''
+                source = {'page': '页面', 'network': '网络'}.get(span['source'], 'Python')
+                # 页面步骤期间有接口请求时标注服务端等待，区分等接口还是等页面
+                detail = span.get('detail') or {}
+                server = f" (接口 {detail['server_ms']:.0f}ms)" if detail.get('server_ms') is not None else ''
+                self.tree.insert(parent, tk.END, text=f"{mark}{span['name']}{server}",
+                                 values=(source, f"{span['start_ms']:.0f}", f"{span['duration_ms']:.0f}", bar))
+        
+    def export_json(self):
+        path = filedialog.asksaveasfilename(
+            parent=self, defaultextension=".json", initialfile="fill_timing.json",
+            filetypes=[("JSON", "*.json")]
+        )
+        if path:
+            self.recorder.export_json(path)
+            messagebox.showinfo("成功", f"已导出到:\n{path}", parent=self)
+
 class AutoFillerGUI:
     def __init__(self):
+        self.startup_marks = {}  # {启动阶段: 毫秒}
+        self.exit_code = 0
         self.window = tk.Tk()
         self.window.title("也许纪念钞预约")
         self.window.geometry("600x900")
@@ -212,24 +414,52 @@ class AutoFillerGUI:
         # 状态变量
         self.is_running = False
         # 多窗口管理 - 使用字典存储每个用户的浏览器实例
-        self.browser_instances = {}  # {user_index: browser}
-        self.page_instances = {}     # {user_index: page}
-        self.window_status = {}      # {user_index: 'disconnected'|'connected'|'filling'|'done'}
+        # 均以用户编号为键（与列表位置无关，删除用户后不会错位）
+        self.browser_instances = {}  # {user_id: browser}
+        self.page_instances = {}     # {user_id: page}
+        self.window_status = {}      # {user_id: 状态文本}
+        self.port_owners = {}        # {调试端口: user_id}
         
         # 数据变量
-        self.config = {}
+        # 配置存储：修改后自动防抖保存，self.config 即 store.data
+        self.store = ConfigStore(on_error=lambda e: self.log(f"❌ 自动保存配置失败: {e}"))
+        self.config = self.store.data
         self.user_infos = [] # 存储身份信息列表
         self.current_location = {} # 存储当前网点信息
         
         # 事件循环管理
         self.loop = None
         self.loop_thread = None
+        self.orchestrator = None
+        self.browser_pool = BrowserPool()
+        self.connection_manager = None
+        
+        # 每个用户最近一次填写的耗时时间线
+        self.timing = TimingRecorder()
+        # 按标签定位字段，结果按页面地址+布局指纹缓存
+        self.field_locator = FieldLocator()
+        # 按表单布局自动识别银行，{user_id: 识别结果}
+        self.profile_detector = ProfileDetector()
+        self.page_profiles = {}
+        self.profile_tasks = {}  # {user_id: 进行中的识别任务}
+        # 级联网点选项树，按站点+银行缓存
+        self.option_tree = OptionTreeCache()
         
         self.create_widgets()
+        self._mark_startup("界面创建")
         self.load_config()
+        self._mark_startup("配置加载")
         
-        # 启动后台事件循环
+        # 启动后台事件循环，Playwright 在后台导入，不阻塞窗口显示
         self._start_event_loop()
+        self.driver_future = self._submit(self._preload_driver())
+        self._submit(self._preload_pinyin())
+        # 后台预连接所有用户对应的调试端口
+        if self.config.get("settings", {}).get("prewarm", True):
+            self._sync_connections()
+        
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        self._mark_startup("初始化完成")
         
     def create_widgets(self):
         """创建界面组件"""
@@ -349,9 +579,17 @@ class AutoFillerGUI:
         self.user_tree.configure(yscrollcommand=list_scroll.set)
         
         self.user_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.user_view = UserListView(self.user_tree)
         list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.user_tree.bind('<<TreeviewSelect>>', self.on_user_select)
         
+        # 右键菜单：对该行的用户单独填写 / 取消
+        self.row_menu = tk.Menu(self.user_tree, tearoff=0)
+        self.row_menu.add_command(label="⚡ 填写", command=self.fill_selected)
+        self.row_menu.add_command(label="⛔ 取消填写", command=self.cancel_selected)
+        self.user_tree.bind('<Button-3>', self.show_row_menu)
+        self.user_tree.bind('<Button-2>', self.show_row_menu)  # macOS 右键
+        
         # 右侧按钮
         btn_box = tk.Frame(user_frame, bg=self.bg_color, pady=5)
         btn_box.pack(fill=tk.X, pady=5)
@@ -363,6 +601,7 @@ class AutoFillerGUI:
         # 多窗口操作按钮
         tk.Button(btn_box, text="🔗 连接选中", command=self.connect_selected, width=10, bg="#FF9800", fg="white", relief=tk.FLAT).pack(side=tk.RIGHT, padx=5)
         tk.Button(btn_box, text="⚡ 填写选中", command=self.fill_selected, width=10, bg="#9C27B0", fg="white", relief=tk.FLAT).pack(side=tk.RIGHT, padx=5)
+        tk.Button(btn_box, text="⛔ 取消选中", command=self.cancel_selected, width=10, bg="#795548", fg="white", relief=tk.FLAT).pack(side=tk.RIGHT, padx=5)
 
         # 5. 网点配置区域
         location_frame = tk.LabelFrame(main_frame, text="📍 兑换网点配置", font=("微软雅黑", 10, "bold"), bg=self.bg_color, fg="#333", padx=10, pady=10)
@@ -394,6 +633,13 @@ class AutoFillerGUI:
         self.qty_entry = tk.Entry(qty_frame, width=10, font=("微软雅黑", 10))
         self.qty_entry.pack(side=tk.LEFT, padx=10)
         self.qty_entry.insert(0, "20")
+        self.qty_entry.bind('<KeyRelease>', self.on_quantity_changed)
+        
+        tk.Label(qty_frame, text="兑换日期:", font=("微软雅黑", 10, "bold"), bg=self.bg_color).pack(side=tk.LEFT, padx=(10, 0))
+        self.date_entry = tk.Entry(qty_frame, width=12, font=("微软雅黑", 10))
+        self.date_entry.pack(side=tk.LEFT, padx=10)
+        self.date_entry.bind('<KeyRelease>', self.on_date_changed)
+        tk.Label(qty_frame, text="(YYYY-MM-DD)", fg="#999", bg=self.bg_color).pack(side=tk.LEFT)
         
         # 7. 主要操作按钮
         action_frame = tk.Frame(main_frame, bg=self.bg_color)
@@ -409,87 +655,104 @@ class AutoFillerGUI:
         tk.Button(action_frame, text="🔍 调试元素", command=self.show_debug_info, bg="#9C27B0", fg="white", font=("微软雅黑", 9, "bold"), relief=tk.FLAT, padx=15, pady=5).pack(side=tk.LEFT, padx=5)
         
         # 8. 日志区域
-        log_label = tk.Label(main_frame, text="📝 运行日志", font=("微软雅黑", 10, "bold"), bg=self.bg_color, fg="#333")
-        log_label.pack(anchor=tk.W, pady=(10, 5))
+        log_header = tk.Frame(main_frame, bg=self.bg_color)
+        log_header.pack(fill=tk.X, pady=(10, 5))
+        tk.Label(log_header, text="📝 运行日志", font=("微软雅黑", 10, "bold"), bg=self.bg_color, fg="#333").pack(side=tk.LEFT)
+        tk.Button(log_header, text="⏱️ 耗时分析", command=self.show_timing_panel, bg="#607D8B", fg="white", font=("微软雅黑", 9), relief=tk.FLAT, padx=10).pack(side=tk.RIGHT)
         
         self.log_text = scrolledtext.ScrolledText(main_frame, font=("Consolas", 9), bg="#1e1e1e", fg="#00ff00", height=10)
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        
+        self.log_sink = LogSink(self.window, self.log_text)
+        self.log_sink.start()
+        
+        # 后台状态变化经状态总线按批刷新到用户列表
+        self.status_bus = StatusBus(self.window, on_error=lambda e: self.log(f"❌ 界面更新出错: {e}"))
+        self.status_bus.subscribe(self._apply_status_batch)
+        self.status_bus.start()
 
     def log(self, message):
-        """输出日志"""
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.window.update()
+        """输出日志（可在任意线程调用，由主循环批量刷新到界面）"""
+        self.log_sink.write(message)
     
     # --- 身份信息管理 ---
     def refresh_user_list(self):
-        """刷新用户列表显示"""
-        # 清空现有项
-        for item in self.user_tree.get_children():
-            self.user_tree.delete(item)
-        
-        # 添加所有用户
-        for idx, user in enumerate(self.user_infos):
-            status = self.window_status.get(idx, '⚪ 未连接')
-            name_display = f"👤 {user.get('name', '未命名')} - {user.get('id_number', '')}"
-            self.user_tree.insert('', tk.END, iid=str(idx), values=(name_display, status))
+        """把用户列表同步到界面（只更新有变化的行）"""
+        self.user_view.sync(self.user_infos, self.window_status)
+    
+    def _user(self, user_id):
+        """按编号查找身份信息，已删除时返回 None"""
+        return next((u for u in self.user_infos if u["id"] == user_id), None)
+    
+    def _user_name(self, user_id):
+        user = self._user(user_id)
+        return user.get('name', '未命名') if user else f"已删除用户({user_id})"
+    
+    def _selected_user_id(self):
+        """当前选中行的用户编号（行 iid 即用户编号）"""
+        selection = self.user_tree.selection()
+        return selection[0] if selection else None
             
     def on_user_select(self, event):
         """用户选择事件"""
-        selection = self.user_tree.selection()
-        if selection:
-            # selection是字符串列表，每个元素是iid
-            pass  # 可以在这里添加选中后的操作
+        user_id = self._selected_user_id()
+        if user_id:
+            index = next((i for i, u in enumerate(self.user_infos) if u["id"] == user_id), 0)
+            self.store.set("selected_user_index", index)
             
     def add_user(self):
         """添加新用户"""
         dialog = UserInfoEditorDialog(self.window)
         self.window.wait_window(dialog)
         if dialog.result:
-            idx = len(self.user_infos)
-            self.user_infos.append(dialog.result)
-            self.window_status[idx] = '⚪ 未连接'
+            user = dialog.result
+            with self.store.update("user_infos") as users:
+                assign_identity(user, users)
+                users.append(user)
             self.refresh_user_list()
+            self._sync_connections()
             # 选中新增的
-            self.user_tree.selection_set(str(idx))
-            self.user_tree.see(str(idx))
+            self.user_tree.selection_set(user["id"])
+            self.user_tree.see(user["id"])
             
     def edit_user(self):
         """编辑用户信息"""
-        selection = self.user_tree.selection()
-        if not selection:
+        user_id = self._selected_user_id()
+        if not user_id:
             messagebox.showwarning("提示", "请先选择要编辑的身份信息")
             return
         
-        index = int(selection[0])
-        user = self.user_infos[index]
+        user = self._user(user_id)
         dialog = UserInfoEditorDialog(self.window, user)
         self.window.wait_window(dialog)
         if dialog.result:
-            self.user_infos[index] = dialog.result
+            # 原地更新，保留编号和端口
+            with self.store.update("user_infos"):
+                user.update(dialog.result)
             self.refresh_user_list()
-            self.user_tree.selection_set(str(index))
             
     def delete_user(self):
         """删除用户"""
-        selection = self.user_tree.selection()
-        if not selection:
+        user_id = self._selected_user_id()
+        if not user_id:
             messagebox.showwarning("提示", "请先选择要删除的身份信息")
             return
             
         if messagebox.askyesno("确认", "确定要删除这条身份信息吗？"):
-            index = int(selection[0])
+            user = self._user(user_id)
             # 如果该用户有连接的浏览器，先断开
-            if index in self.browser_instances:
-                Thread(target=lambda: self._disconnect_single_browser(index), daemon=True).start()
-            
-            del self.user_infos[index]
-            if index in self.window_status:
-                del self.window_status[index]
-            
-            # 重新索引所有数据
-            self._reindex_after_delete(index)
+            self.browser_instances.pop(user_id, None)
+            self.page_instances.pop(user_id, None)
+            self.page_profiles.pop(user_id, None)
+            self.window_status.pop(user_id, None)
+            self.status_bus.forget(user_id)
+            self._submit(self.connection_manager.unwatch(user["port"]))
+            
+            with self.store.update("user_infos") as users:
+                users.remove(user)
+            # 其他用户的编号、端口和状态都不受影响
             self.refresh_user_list()
+            self._sync_connections()
 
     # --- 网点管理 ---
     def update_location_display(self):
@@ -506,163 +769,235 @@ class AutoFillerGUI:
 
     def edit_location(self):
         bank = self.bank_var.get()
-        dialog = LocationEditorDialog(self.window, bank, self.current_location)
+        catalog = OutletCatalog.from_option_tree(self.option_tree, bank)
+        dialog = LocationEditorDialog(self.window, bank, self.current_location, catalog=catalog)
         self.window.wait_window(dialog)
         if dialog.result:
             # 更新网点信息
-            self.current_location.update(dialog.result)
+            with self.store.update("exchange_location") as location:
+                location.update(dialog.result)
             self.update_location_display()
             
     def on_bank_changed(self, event):
+        self.store.set("bank", self.bank_var.get())
         self.update_location_display()
+    
+    def on_quantity_changed(self, event):
+        try:
+            quantity = int(self.qty_entry.get())
+        except ValueError:
+            return
+        self.store.set("quantity", quantity)
+    
+    def on_date_changed(self, event):
+        """日期格式正确时才保存，输入到一半时不覆盖配置"""
+        text = self.date_entry.get().strip()
+        try:
+            date.fromisoformat(text)
+        except ValueError:
+            self.date_entry.config(fg="red")
+            return
+        self.date_entry.config(fg="black")
+        self.store.set("target_date", text)
         
     # --- 配置加载与保存 ---
     def load_config(self):
         try:
-            with open("config.json", "r", encoding="utf-8") as f:
-                self.config = json.load(f)
+            problems = self.store.load()
+            self.config = self.store.data
+            for problem in problems:
+                self.log(f"🔧 配置迁移: {problem}")
+            if self.store.backup_path:
+                backup = self.store.backup_path
+                self.window.after_idle(lambda: messagebox.showwarning(
+                    "配置文件损坏", f"config.json 无法解析，已另存为\n{backup}\n\n当前使用默认配置，可从备份中找回原来的内容"))
+            
+            # 日志设置
+            settings = self.config["settings"]
+            self.log_sink.max_lines = settings.get("log_max_lines", DEFAULT_MAX_LINES)
+            if settings.get("log_file"):
+                self.log_sink.enable_file(settings["log_file"])
+            # 可选：状态变化写入日志 / 状态文件
+            if settings.get("status_log"):
+                self.status_bus.subscribe(self._log_status_batch)
+            if settings.get("status_file"):
+                self.status_bus.subscribe(StatusFileWriter(self.status_bus, settings["status_file"]))
             
             # 加载基础设置
-            self.bank_var.set(self.config.get("bank", "农业银行"))
+            self.bank_var.set(self.config["bank"])
             self.qty_entry.delete(0, tk.END)
-            self.qty_entry.insert(0, str(self.config.get("quantity", 20)))
-            
-            # 加载身份列表
-            # 兼容旧版本：如果是旧格式（字典），转为列表
-            user_info = self.config.get("user_info")
-            user_infos = self.config.get("user_infos")
+            self.qty_entry.insert(0, str(self.config["quantity"]))
+            self.date_entry.delete(0, tk.END)
+            self.date_entry.insert(0, self.config["target_date"])
             
-            if user_infos and isinstance(user_infos, list):
-                self.user_infos = user_infos
-            elif user_info and isinstance(user_info, dict):
-                self.user_infos = [user_info]
-            else:
-                self.user_infos = [] # 默认空
+            # 加载身份列表（旧版单个 user_info 已在读取时迁移为列表），与配置共用同一个列表
+            self.user_infos = self.config["user_infos"]
             
             # 初始化状态
-            for idx in range(len(self.user_infos)):
-                self.window_status[idx] = '⚪ 未连接'
+            for user in self.user_infos:
+                self.window_status[user["id"]] = '⚪ 未连接'
                 
             self.refresh_user_list()
             
             # 恢复之前的选择
-            sel_idx = self.config.get("selected_user_index", 0)
+            sel_idx = self.config["selected_user_index"]
             if 0 <= sel_idx < len(self.user_infos):
-                self.user_tree.selection_set(str(sel_idx))
-                self.user_tree.see(str(sel_idx))
+                self.user_tree.selection_set(self.user_infos[sel_idx]["id"])
+                self.user_tree.see(self.user_infos[sel_idx]["id"])
             
             # 加载网点信息
-            self.current_location = self.config.get("exchange_location", {})
+            self.current_location = self.config["exchange_location"]
             self.update_location_display()
             
             self.log("✅ 配置已加载")
         except Exception as e:
             self.log(f"⚠️ 加载配置失败: {e}")
-            self.user_infos = []
+            if self.store.read_only:
+                self.log("⚠️ 已停止自动保存，避免覆盖原配置文件")
+            self.config = self.store.data
+            self.user_infos = self.config["user_infos"]
+            self.current_location = self.config["exchange_location"]
             
     def save_config(self):
-        config = {
-            "bank": self.bank_var.get(),
-            "bank_configs": self.config.get("bank_configs", {}), # 保留原有
-            "user_infos": self.user_infos,
-            "selected_user_index": int(self.user_tree.selection()[0]) if self.user_tree.selection() else 0,
-            "exchange_location": self.current_location,
-            "quantity": int(self.qty_entry.get()),
-            "target_url": self.config.get("target_url", "http://纪念钞.vip:8888/new-abchina"),
-            "settings": self.config.get("settings", {
-                "auto_submit": False,
-                "use_ocr": True,
-                "timeout": 5000
-            })
-        }
-        
+        """立即保存（修改本身已会自动保存，这里只是不等防抖周期）"""
         try:
-            with open("config.json", "w", encoding="utf-8") as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            self.store.set("bank", self.bank_var.get())
+            self.on_quantity_changed(None)
+            # 即使没有未保存的修改也写一次，确保磁盘上的文件与界面一致
+            self.store.mark_dirty("user_infos")
+            self.store.flush()
             self.log("✅ 配置已保存")
-            messagebox.showinfo("成功", "配置已保存！")
         except Exception as e:
             self.log(f"❌ 保存失败: {e}")
             messagebox.showerror("错误", f"保存失败: {e}")
 
     # --- 异步事件循环管理 ---
     def _start_event_loop(self):
-        """启动后台异步事件循环"""
+        """启动后台异步事件循环，事件循环真正运行后才返回"""
+        ready = threading.Event()
+        
         def run_loop():
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
             self.loop.run_forever()
         
         self.loop_thread = Thread(target=run_loop, daemon=True)
         self.loop_thread.start()
-        import time
-        time.sleep(0.1)
+        if not ready.wait(timeout=5):
+            raise RuntimeError("后台事件循环启动超时")
+        self._mark_startup("事件循环就绪")
+        self.orchestrator = SessionOrchestrator(self.loop)
+        self.connection_manager = ConnectionManager(
+            self.browser_pool,
+            self._on_connection_change,
+            heartbeat_interval=self.config.get("settings", {}).get("heartbeat_interval", 5.0),
+            heartbeat_failures=self.config.get("settings", {}).get("heartbeat_failures", 3)
+        )
         
-    def _run_async(self, coro):
-        """在后台事件循环中运行异步协程"""
+    def _submit(self, coro):
+        """把协程提交到后台事件循环执行，不阻塞调用线程"""
         if self.loop is None:
             raise RuntimeError("事件循环未启动")
-        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
-        return future.result()
+        
+        def on_error(e):
+            self.log(f"❌ 后台任务出错: {e}")
+        
+        return self.orchestrator.submit(coro, on_error=on_error)
+    
+    def _sync_connections(self):
+        """按当前用户列表维护预连接的调试端口"""
+        self.port_owners = {user["port"]: user["id"] for user in self.user_infos}
+        self._submit(self.connection_manager.sync(set(self.port_owners)))
+    
+    def _on_connection_change(self, port, state, page):
+        """后台连接状态变化（在事件循环线程中回调）"""
+        user_id = self.port_owners.get(port)
+        if user_id is None:
+            return
+        user_name = self._user_name(user_id)
+        if state == 'connected':
+            self.browser_instances[user_id] = self.browser_pool.browsers.get(port)
+            self.page_instances[user_id] = page
+            self.log(f"🔗 [{user_name}] 窗口已就绪 (端口:{port}, URL:{page.url})")
+            # 连接后立即识别银行，填写时直接复用识别结果
+            self._submit(self._ensure_profile(user_id, page, user_name))
+        else:
+            self.browser_instances.pop(user_id, None)
+            self.page_instances.pop(user_id, None)
+            self.page_profiles.pop(user_id, None)
+            if state == 'reconnecting':
+                self.log(f"🔄 [{user_name}] 窗口连接断开，正在重连 (端口:{port})")
+        self._set_status(user_id, CONNECTION_STATUS[state])
+    
+    def _set_status(self, user_id, status):
+        """发布状态变化（任意线程），由状态总线按批刷新到界面"""
+        self.status_bus.publish(user_id, status, name=self._user_name(user_id))
 
     # --- 多窗口浏览器控制 ---
-    def _reindex_after_delete(self, deleted_index):
-        """删除用户后重新索引所有数据"""
-        # 重建字典，索引减1
-        new_browsers = {}
-        new_pages = {}
-        new_status = {}
-        
-        for idx in sorted(self.browser_instances.keys()):
-            if idx > deleted_index:
-                new_browsers[idx - 1] = self.browser_instances[idx]
-                new_pages[idx - 1] = self.page_instances[idx]
-                new_status[idx - 1] = self.window_status[idx]
-            elif idx < deleted_index:
-                new_browsers[idx] = self.browser_instances[idx]
-                new_pages[idx] = self.page_instances[idx]
-                new_status[idx] = self.window_status[idx]
-        
-        self.browser_instances = new_browsers
-        self.page_instances = new_pages
-        self.window_status = new_status
+    def _apply_status_batch(self, events):
+        """状态总线订阅者：一批状态变化中每个用户只取最后一个，只改对应的状态单元格"""
+        for user_id, event in latest_by_user(events).items():
+            if self._user(user_id) is None:
+                continue
+            self.window_status[user_id] = event["status"]
+            self.user_view.set_status(user_id, event["status"])
     
-    def update_user_status(self, user_index, status):
-        """更新用户状态显示"""
-        self.window_status[user_index] = status
-        # 更新树视图中的状态列
-        if str(user_index) in self.user_tree.get_children():
-            current_values = self.user_tree.item(str(user_index), 'values')
-            if current_values:
-                self.user_tree.item(str(user_index), values=(current_values[0], status))
+    def _log_status_batch(self, events):
+        """状态总线订阅者：把每一次状态变化写入日志"""
+        for event in events:
+            self.log(f"📶 [{event['name']}] {event['status']}")
     
     def connect_selected(self):
         """连接选中的用户窗口"""
-        selection = self.user_tree.selection()
-        if not selection:
+        user_id = self._selected_user_id()
+        if not user_id:
             messagebox.showwarning("提示", "请先选择要连接的用户")
             return
         
-        user_index = int(selection[0])
-        self.log(f"🔗 正在为用户 [{self.user_infos[user_index]['name']}] 连接浏览器...")
-        Thread(target=lambda: self._connect_single_browser(user_index), daemon=True).start()
+        self.log(f"🔗 正在为用户 [{self._user_name(user_id)}] 连接浏览器...")
+        self._submit(self._connect_single_browser(user_id, self._fill_inputs()))
     
     def fill_selected(self):
         """填写选中的用户窗口"""
-        selection = self.user_tree.selection()
-        if not selection:
+        user_id = self._selected_user_id()
+        if not user_id:
             messagebox.showwarning("提示", "请先选择要填写的用户")
             return
         
-        user_index = int(selection[0])
-        
-        if user_index not in self.page_instances:
+        if user_id not in self.page_instances:
             messagebox.showwarning("提示", "该用户尚未连接浏览器，请先连接")
             return
         
-        user_data = self.user_infos[user_index]
+        if self.orchestrator.running(user_id):
+            messagebox.showwarning("提示", "该用户正在填写，可先取消再重新填写")
+            return
+        
+        user_data = self._user(user_id)
         self.log(f"⚡ 开始为用户 [{user_data['name']}] 自动填写...")
-        Thread(target=lambda: self._fill_single_user(user_index, user_data), daemon=True).start()
+        self._submit(self._fill_single_user(user_id, user_data, self._fill_inputs()))
+    
+    def cancel_selected(self):
+        """取消选中用户正在进行的连接/填写，其它用户的任务继续执行"""
+        user_id = self._selected_user_id()
+        if not user_id:
+            messagebox.showwarning("提示", "请先选择要取消的用户")
+            return
+        if not self.orchestrator.running(user_id):
+            self.log(f"ℹ️ 用户 [{self._user_name(user_id)}] 没有进行中的填写")
+            return
+        self.log(f"⛔ 正在取消用户 [{self._user_name(user_id)}] 的填写...")
+        self.orchestrator.cancel(user_id)
+    
+    def show_row_menu(self, event):
+        """在用户行上右键：选中该行并弹出菜单，取消项只在该用户有进行中的填写时可用"""
+        row = self.user_tree.identify_row(event.y)
+        if not row:
+            return
+        self.user_tree.selection_set(row)
+        running = self.orchestrator is not None and self.orchestrator.running(row)
+        self.row_menu.entryconfig(1, state=tk.NORMAL if running else tk.DISABLED)
+        self.row_menu.tk_popup(event.x_root, event.y_root)
     
     def connect_all(self):
         """连接所有用户的浏览器窗口"""
@@ -671,11 +1006,9 @@ class AutoFillerGUI:
             return
         
         self.log("🔗 开始批量连接所有用户...")
-        for idx in range(len(self.user_infos)):
-            if idx not in self.browser_instances:
-                Thread(target=lambda i=idx: self._connect_single_browser(i), daemon=True).start()
-                import time
-                time.sleep(0.1)  # 错开启动时间
+        user_ids = [u["id"] for u in self.user_infos if u["id"] not in self.browser_instances]
+        inputs = self._fill_inputs()
+        self._submit(self._run_batch("连接", {uid: self._connect_single_browser(uid, inputs) for uid in user_ids}))
     
     def disconnect_all(self):
         """断开所有浏览器连接"""
@@ -684,9 +1017,15 @@ class AutoFillerGUI:
             return
         
         self.log("🔌 正在断开所有连接...")
-        indices = list(self.browser_instances.keys())
-        for idx in indices:
-            Thread(target=lambda i=idx: self._disconnect_single_browser(i), daemon=True).start()
+        user_ids = list(self.browser_instances.keys())
+        
+        async def _disconnect_all():
+            await self._run_batch("断开", {uid: self._disconnect_single_browser(uid) for uid in user_ids})
+            # 全部断开后停止后台保活和共享的 Playwright 驱动
+            await self.connection_manager.close()
+            await self.browser_pool.close()
+        
+        self._submit(_disconnect_all())
     
     def fill_all(self):
         """为所有已连接的用户执行自动填写"""
@@ -695,906 +1034,315 @@ class AutoFillerGUI:
             return
         
         self.log("⚡ 开始批量填写所有窗口...")
-        for idx, page in self.page_instances.items():
-            user_data = self.user_infos[idx]
-            Thread(target=lambda i=idx, u=user_data: self._fill_single_user(i, u), daemon=True).start()
+        # 正在填写的窗口不重复提交
+        inputs = self._fill_inputs()
+        jobs = {uid: self._fill_single_user(uid, self._user(uid), inputs) for uid in list(self.page_instances)
+                if self._user(uid) and not self.orchestrator.running(uid)}
+        self._submit(self._run_batch("填写", jobs))
+    
+    async def _run_batch(self, action, jobs):
+        """并发执行一批窗口任务，总耗时取决于最慢的窗口"""
+        start_time = time.time()
+        results = await self.orchestrator.gather(jobs)
+        for user_id, result in results.items():
+            if isinstance(result, Exception):
+                self.log(f"❌ [{self._user_name(user_id)}] {action}出错: {result}")
+        self.log(f"⏱️ 批量{action}完成 ({len(results)} 个窗口, 耗时 {time.time() - start_time:.3f} 秒)")
+        return results
+    
+    def _fill_inputs(self):
+        """在主线程读取界面上的填写参数，后台任务只使用这份快照，不直接读取 Tk 控件"""
+        return {"bank": self.bank_var.get(), "quantity": self.qty_entry.get()}
     
-    def _connect_single_browser(self, user_index):
-        """连接单个用户的浏览器"""
+    async def _connect_single_browser(self, user_id, inputs):
+        """连接单个用户的浏览器（端口为该用户固定分配的调试端口）"""
+        user = self._user(user_id)
+        user_name = user['name']
+        port = user['port']
+        timeline = FillTimeline(user_name)
         try:
-            user_name = self.user_infos[user_index]['name']
-            self.window.after(0, lambda: self.update_user_status(user_index, '🔗 连接中...'))
+            self._set_status(user_id, '🔗 连接中...')
             
-            # 计算端口号: 基础9222 + user_index
-            port = 9222 + user_index
+            # 已预连接时直接复用，否则立即连接
+            with timeline.span("连接"):
+                page = await self.connection_manager.ensure_page(port)
             
-            async def connect():
-                playwright = await async_playwright().start()
-                browser = await playwright.chromium.connect_over_cdp(f"http://localhost:{port}")
-                contexts = browser.contexts
-                if contexts and contexts[0].pages:
-                    page = contexts[0].pages[-1]
-                    return browser, page
-                else:
-                    await browser.close()
-                    return None, None
-            
-            browser, page = self._run_async(connect())
-            
-            if browser and page:
-                self.browser_instances[user_index] = browser
-                self.page_instances[user_index] = page
-                self.log(f"✅ 用户 [{user_name}] 已连接 (端口:{port}, URL:{page.url})")
-                self.window.after(0, lambda: self.update_user_status(user_index, '✅ 已连接'))
-                
-                # 连接成功后自动开始填写
-                import time
-                time.sleep(0.5)  # 稍等一下确保页面稳定
-                self.log(f"⚡ 自动开始为 [{user_name}] 填写...")
-                user_data = self.user_infos[user_index]
-                Thread(target=lambda: self._fill_single_user(user_index, user_data), daemon=True).start()
-            else:
-                self.log(f"❌ 用户 [{user_name}] 连接失败: 未找到页面 (端口:{port})")
-                self.window.after(0, lambda: self.update_user_status(user_index, '❌ 连接失败'))
+            self.browser_instances[user_id] = self.browser_pool.browsers.get(port)
+            self.page_instances[user_id] = page
+            self.log(f"✅ 用户 [{user_name}] 已连接 (端口:{port}, URL:{page.url})")
+            self._set_status(user_id, '✅ 已连接')
                 
         except Exception as e:
-            user_name = self.user_infos[user_index]['name']
             self.log(f"❌ 用户 [{user_name}] 连接失败: {e}")
-            self.window.after(0, lambda: self.update_user_status(user_index, '❌ 连接失败'))
+            self._set_status(user_id, '❌ 连接失败')
+            self.timing.record(user_id, timeline)
+            return False
+        
+        # 连接成功后自动开始填写，等表单渲染完成即开始
+        with timeline.span("等待表单"):
+            ready = await wait_for_form_ready(page, resolve_timeout(self.config))
+        if not ready:
+            self.log(f"⚠️ 用户 [{user_name}] 页面表单未就绪，仍尝试填写")
+        with timeline.span("识别表单"):
+            await self._ensure_profile(user_id, page, user_name)
+        self.log(f"⚡ 自动开始为 [{user_name}] 填写...")
+        return await self._fill_single_user(user_id, user, inputs, timeline)
     
-    def _disconnect_single_browser(self, user_index):
+    async def _disconnect_single_browser(self, user_id):
         """断开单个用户的浏览器"""
         try:
-            if user_index in self.browser_instances:
-                user_name = self.user_infos[user_index]['name']
-                self._run_async(self.browser_instances[user_index].close())
-                del self.browser_instances[user_index]
-                del self.page_instances[user_index]
+            if user_id in self.browser_instances:
+                user_name = self._user_name(user_id)
+                self.browser_instances.pop(user_id)
+                self.page_instances.pop(user_id, None)
+                self.page_profiles.pop(user_id, None)
+                port = next((p for p, uid in self.port_owners.items() if uid == user_id), None)
+                if port is not None:
+                    await self.connection_manager.unwatch(port)
                 self.log(f"✅ 用户 [{user_name}] 已断开连接")
-                self.window.after(0, lambda: self.update_user_status(user_index, '⚪ 未连接'))
+                self._set_status(user_id, '⚪ 未连接')
         except Exception as e:
             self.log(f"❌ 断开失败: {e}")
     
-    def _fill_single_user(self, user_index, user_data):
-        """为单个用户执行自动填写"""
+    async def _fill_single_user(self, user_id, user_data, inputs, timeline=None):
+        """为单个用户执行自动填写；任务按用户登记，可单独取消，整次填写有截止时间，卡住的窗口不影响其它窗口"""
+        user_name = user_data.get('name', '未知用户')
+        timeline = timeline or FillTimeline(user_name)
+        # 填写期间暂停该窗口的心跳，导航/提交时的心跳失败不会断开正在使用的连接
+        with self.orchestrator.track(user_id), self.connection_manager.hold(user_data["port"]):
+            return await self._fill_tracked(user_id, user_data, user_name, inputs, timeline)
+    
+    async def _fill_tracked(self, user_id, user_data, user_name, inputs, timeline):
         try:
-            user_name = user_data['name']
-            page = self.page_instances.get(user_index)
+            page = self.page_instances.get(user_id)
             
             if not page:
                 self.log(f"❌ 用户 [{user_name}] 未找到页面实例")
-                return
+                return False
             
-            self.window.after(0, lambda: self.update_user_status(user_index, '⚡ 填写中...'))
+            self._set_status(user_id, '⚡ 填写中...')
             self.log(f"[{user_name}] 开始自动填写...")
             
-            # 调用填写方法
-            self._perform_fill_for_page(page, user_data, user_name)
-            
-            self.log(f"[{user_name}] ✅ 填写完成")
-            self.window.after(0, lambda: self.update_user_status(user_index, '✅ 已填写'))
+            # 通常连接时已识别；未识别或页面地址变化时在这里补做
+            profile = self.page_profiles.get(user_id)
+            if profile is None or profile["url"] != page.url:
+                with timeline.span("识别表单"):
+                    profile = await self._ensure_profile(user_id, page, user_name)
             
+            # 调用填写方法
+            result = await self._perform_fill_for_page(
+                page, user_data, user_name, timeline, inputs, bank=profile and profile["bank"]
+            )
+            success = result.get('success', False)
+            verification = result.get('verification')
+            
+            if success:
+                self.log(f"[{user_name}] ✅ 填写完成")
+                self._set_status(user_id, '✅ 已填写' if verification is None else '✅ 已核对')
+            elif verification and not verification['ok'] and all(s.get('ok') for s in result.get('steps', [])):
+                # 各步骤都报告成功，但读回的表单与期望不一致
+                self.log(f"[{user_name}] ⚠️ 填写完成，核对发现 {len(verification['mismatches'])} 项不一致")
+                self.log(f"[{user_name}] 💡 再次填写会跳过页面上已完成的部分，只补做不一致的字段")
+                self._set_status(user_id, f"⚠️ {len(verification['mismatches'])}项不一致")
+            else:
+                self.log(f"[{user_name}] ⚠️ 填写完成，部分步骤失败")
+                self.log(f"[{user_name}] 💡 再次填写会跳过页面上已完成的部分，只补做失败的步骤")
+                self._set_status(user_id, '⚠️ 部分完成')
+            return success
+            
+        except asyncio.CancelledError:
+            self.log(f"[{user_name}] ⛔ 填写已取消")
+            self._set_status(user_id, '⛔ 已取消')
+            raise
+        except asyncio.TimeoutError:
+            self.log(f"[{user_name}] ⏰ 填写超时，已停止（其它窗口不受影响）")
+            self.log(f"[{user_name}] 💡 再次填写会跳过页面上已完成的部分，只补做失败的步骤")
+            self._set_status(user_id, '⏰ 填写超时')
+            return False
         except Exception as e:
-            user_name = user_data.get('name', '未知用户')
             self.log(f"[{user_name}] ❌ 填写失败: {e}")
             import traceback
             self.log(traceback.format_exc())
-            self.window.after(0, lambda: self.update_user_status(user_index, '❌ 填写失败'))
+            self.log(f"[{user_name}] 💡 再次填写会跳过页面上已完成的部分，只补做失败的步骤")
+            self._set_status(user_id, '❌ 填写失败')
+            return False
+        finally:
+            self.timing.record(user_id, timeline)
+    
+    def _browser_launcher(self):
+        """查找本机浏览器（可在 settings.browser_path 中指定），找不到时提示并返回 None"""
+        launcher = BrowserLauncher.discover(self.config.get("settings", {}).get("browser_path"))
+        if launcher is None:
+            messagebox.showerror("错误", "未找到Chrome、Chromium或Edge浏览器，请手动安装\n"
+                                         "或在 config.json 的 settings.browser_path 中指定浏览器路径")
+            self.log("❌ 未找到Chrome/Chromium/Edge浏览器")
+        return launcher
+    
+    def _launch_ports(self, count):
+        """要启动的调试端口：优先使用各用户固定分配的端口，用户不足时顺延空闲端口"""
+        ports = [user["port"] for user in self.user_infos][:count]
+        port = BASE_PORT
+        while len(ports) < count:
+            if port not in ports:
+                ports.append(port)
+            port += 1
+        return ports
     
     def start_single_browser(self):
-        """启动单个调试模式的Chrome浏览器"""
-        try:
-            self.log("🚀 正在启动Chrome浏览器（调试模式）...")
-            
-            # 使用9222端口
-            port = 9222
-            user_data_dir = os.path.join(tempfile.gettempdir(), "chrome_debug_profile")
-            
-            # 查找Chrome可执行文件
-            chrome_paths = [
-                r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-                r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-                os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
-                r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
-                r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe"
-            ]
-            
-            chrome_exe = None
-            for path in chrome_paths:
-                if os.path.exists(path):
-                    chrome_exe = path
-                    break
-            
-            if not chrome_exe:
-                messagebox.showerror("错误", "未找到Chrome或Edge浏览器，请手动安装")
-                self.log("❌ 未找到Chrome或Edge浏览器")
-                return
-            
-            # 启动浏览器
-            cmd = [
-                chrome_exe,
-                f"--remote-debugging-port={port}",
-                f"--user-data-dir={user_data_dir}"
-            ]
-            
-            subprocess.Popen(cmd, shell=False)
-            
-            browser_name = "Edge" if "msedge" in chrome_exe.lower() else "Chrome"
-            self.log(f"✅ {browser_name}浏览器已启动（调试端口: {port}）")
-            self.log("💡 下一步: 在浏览器中打开预约页面，然后点击\"连接\"按钮")
-            
-            messagebox.showinfo(
-                "成功", 
-                f"{browser_name}浏览器已启动！\n\n"
-                f"调试端口: {port}\n\n"
-                "请在浏览器中打开预约页面，\n"
-                "然后点击\"🔗 连接选中\"或\"🔗 全部连接\"按钮"
-            )
-            
-        except Exception as e:
-            self.log(f"❌ 启动浏览器失败: {e}")
-            messagebox.showerror("错误", f"启动浏览器失败:\n{e}")
+        """启动单个调试模式的浏览器（端口为选中用户的调试端口）"""
+        launcher = self._browser_launcher()
+        if launcher is None:
+            return
+        user_id = self._selected_user_id()
+        port = self._user(user_id)["port"] if user_id else BASE_PORT
+        self.log(f"🚀 正在启动{launcher.name}浏览器（调试端口: {port}）...")
+        self._submit(self._launch_browsers(launcher, [port]))
     
     def start_multiple_browsers(self):
-        """启动多个调试模式的Chrome浏览器"""
+        """并发启动多个调试模式的浏览器"""
         try:
-            # 获取窗口数量
-            try:
-                num_windows = int(self.browser_count_var.get())
-                if num_windows < 1 or num_windows > 10:
-                    messagebox.showwarning("提示", "窗口数量必须在1-10之间")
-                    return
-            except ValueError:
-                messagebox.showwarning("提示", "请输入有效的窗口数量")
+            num_windows = int(self.browser_count_var.get())
+            if num_windows < 1 or num_windows > 10:
+                messagebox.showwarning("提示", "窗口数量必须在1-10之间")
                 return
-            
-            self.log(f"🚀 正在启动 {num_windows} 个Chrome浏览器窗口...")
-            
-            # 查找Chrome可执行文件
-            chrome_paths = [
-                r"C:\Program Files\Google\Chrome\Application\chrome.exe",
-                r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
-                os.path.expandvars(r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
-                r"C:\Program Files\Microsoft\Edge\Application\msedge.exe",
-                r"C:\Program Files (x86)\Microsoft\Edge\Application\msedge.exe"
-            ]
-            
-            chrome_exe = None
-            for path in chrome_paths:
-                if os.path.exists(path):
-                    chrome_exe = path
-                    break
-            
-            if not chrome_exe:
-                messagebox.showerror("错误", "未找到Chrome或Edge浏览器，请手动安装")
-                self.log("❌ 未找到Chrome或Edge浏览器")
-                return
-            
-            browser_name = "Edge" if "msedge" in chrome_exe.lower() else "Chrome"
-            
-            # 启动多个浏览器实例
-            import time
-            for i in range(num_windows):
-                port = 9222 + i
-                user_data_dir = os.path.join(tempfile.gettempdir(), f"chrome_debug_profile_{i}")
-                
-                cmd = [
-                    chrome_exe,
-                    f"--remote-debugging-port={port}",
-                    f"--user-data-dir={user_data_dir}",
-                    "--new-window"
-                ]
-                
-                subprocess.Popen(cmd, shell=False)
-                self.log(f"  ✅ 窗口 {i+1}/{num_windows} 已启动（调试端口: {port}）")
-                time.sleep(0.3)  # 错开启动时间
-            
-            self.log(f"✅ 所有 {num_windows} 个{browser_name}窗口已启动")
-            self.log("💡 下一步: 在每个浏览器窗口中打开预约页面，然后点击\"全部连接\"")
-            
-            messagebox.showinfo(
-                "成功", 
-                f"已启动 {num_windows} 个{browser_name}窗口！\n\n"
-                f"调试端口范围: 9222-{9222+num_windows-1}\n\n"
-                "请在每个浏览器窗口中打开预约页面，\n"
-                "然后点击\"🔗 全部连接\"按钮"
-            )
-            
-        except Exception as e:
-            self.log(f"❌ 启动浏览器失败: {e}")
-            messagebox.showerror("错误", f"启动浏览器失败:\n{e}")
+        except ValueError:
+            messagebox.showwarning("提示", "请输入有效的窗口数量")
+            return
+        
+        launcher = self._browser_launcher()
+        if launcher is None:
+            return
+        ports = self._launch_ports(num_windows)
+        self.log(f"🚀 正在并发启动 {num_windows} 个{launcher.name}浏览器窗口 (端口: {', '.join(map(str, ports))})...")
+        self._submit(self._launch_browsers(launcher, ports))
+    
+    async def _launch_browsers(self, launcher, ports):
+        """并发启动并等待各调试端口就绪；已分配给用户的端口一就绪立即连接，不等其它窗口"""
+        start_time = time.time()
+        
+        def on_ready(port, result):
+            user_id = self.port_owners.get(port)
+            owner = f" → [{self._user_name(user_id)}]" if user_id else ""
+            state = "已在运行" if result["reused"] else f"已就绪 ({result['ms']:.0f} ms)"
+            self.log(f"  ✅ 端口 {port} {state}{owner}")
+            if user_id:
+                self.connection_manager.wake(port)
+        
+        results = await launcher.launch_many(ports, on_ready=on_ready)
+        failed = {port: result for port, result in results.items() if not result["ok"]}
+        for port, result in failed.items():
+            self.log(f"  ❌ 端口 {port} 启动失败: {result['error']}")
+        ready = len(results) - len(failed)
+        self.log(f"⏱️ {ready}/{len(results)} 个{launcher.name}窗口已就绪 (耗时 {time.time() - start_time:.3f} 秒)")
+        
+        if ready:
+            self.log("💡 下一步: 在浏览器中打开预约页面，已分配端口的用户会自动连接")
+            message = (f"已启动 {ready} 个{launcher.name}窗口！\n\n"
+                       f"调试端口: {', '.join(str(p) for p in results if p not in failed)}\n\n"
+                       "请在浏览器中打开预约页面，\n"
+                       "已分配端口的用户会自动连接，也可点击\"🔗 全部连接\"按钮")
+            self.status_bus.call_soon(lambda: messagebox.showinfo("成功", message))
+        else:
+            self.status_bus.call_soon(lambda: messagebox.showerror("错误", "启动浏览器失败，详见日志"))
+        return results
 
 
-    def _perform_fill_for_page(self, page, user_data, user_name):
-        """为指定页面执行自动填写"""
-        import time
-        current_bank = self.bank_var.get()
-        bank_config = self.config.get("bank_configs", {}).get(current_bank, {})
-        field_indices = bank_config.get("field_indices", {})
-        use_cascader = bank_config.get("use_cascader", True)
-        
-        # 1. 填写基础信息
-        self.log(f"[{user_name}] 📝 填写基础信息...")
-        
-        js_code_fill = f'''() => {{
-            let filled = {{'name': false, 'id': false, 'phone': false, 'qty': false}};
-            let logs = [];
-            const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-            
-            function fillByIndex(index, value, fieldName) {{
-                if (inputs[index]) {{
-                    const input = inputs[index];
-                    input.focus();
-                    input.value = value;
-                    input.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                    input.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                    input.dispatchEvent(new Event('blur', {{ bubbles: true }}));
-                    if (input.value === value) {{
-                        logs.push(`✅ ${{fieldName}}: OK`);
-                        return true;
-                    }}
-                }}
-                logs.push(`⚠️ ${{fieldName}}: 失败`);
-                return false;
-            }}
-            
-            filled.name = fillByIndex({field_indices.get('name', 0)}, '{user_data.get('name')}', '姓名');
-            filled.id = fillByIndex({field_indices.get('id_number', 1)}, '{user_data.get('id_number')}', '证件号');
-            filled.phone = fillByIndex({field_indices.get('phone', 2)}, '{user_data.get('phone')}', '手机');
-            filled.qty = fillByIndex({field_indices.get('quantity', 7)}, '{self.qty_entry.get()}', '数量');
-            
-            return {{ filled, logs }};
-        }}'''
-        
-        result_fill = self._run_async(page.evaluate(js_code_fill))
-        for log in result_fill['logs']:
-            self.log(f"[{user_name}]   {log}")
-            
-        time.sleep(0.5)
-        
-        # 1.5. 勾选所有checkbox（条款同意等）
-        self.log(f"[{user_name}] ☑️ 勾选条款...")
-        
-        js_code_checkbox = '''() => {
-            let checkedCount = 0;
-            const checkboxes = document.querySelectorAll('input[type="checkbox"], .el-checkbox');
-            
-            checkboxes.forEach(el => {
-                // 如果是原生checkbox
-                if (el.tagName === 'INPUT' && !el.checked) {
-                    el.click();
-                    checkedCount++;
-                }
-                // 如果是element-ui的checkbox
-                else if (el.classList.contains('el-checkbox') && !el.classList.contains('is-checked')) {
-                    el.click();
-                    checkedCount++;
-                }
-            });
-            
-            return { count: checkedCount };
-        }'''
-        
+    async def _ensure_profile(self, user_id, page, user_name):
+        """返回页面的识别结果：已识别且页面地址未变时直接复用，同一用户同时只进行一次识别"""
+        profile = self.page_profiles.get(user_id)
+        if profile is not None and profile["url"] == page.url:
+            return profile
+        task = self.profile_tasks.get(user_id)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._detect_when_ready(user_id, page, user_name))
+            self.profile_tasks[user_id] = task
+        # 填写被取消时识别继续完成，结果留给下一次填写
+        return await asyncio.shield(task)
+    
+    async def _detect_when_ready(self, user_id, page, user_name):
+        """等表单渲染完成后识别银行，超时返回 None（按界面上选择的银行填写）"""
+        timeout_ms = resolve_timeout(self.config)
         try:
-            checkbox_result = self._run_async(page.evaluate(js_code_checkbox))
-            if checkbox_result['count'] > 0:
-                self.log(f"[{user_name}]   ✅ 已勾选 {checkbox_result['count']} 个选项")
-            else:
-                self.log(f"[{user_name}]   ℹ️ 无需勾选")
+            await wait_for_form_ready(page, timeout_ms)
+            return await asyncio.wait_for(self._detect_profile(user_id, page, user_name), timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            self.log(f"[{user_name}] ⚠️ 表单识别超时，按当前选择的银行填写")
+            return None
+    
+    async def _detect_profile(self, user_id, page, user_name):
+        """按表单布局识别银行；识别成功时切换当前银行并预先写入字段定位缓存"""
+        if not self.config.get("settings", {}).get("auto_detect_bank", True):
+            return None
+        try:
+            detection = await self.profile_detector.detect(page, self.store)
         except Exception as e:
-            self.log(f"[{user_name}]   ⚠️ 勾选失败: {e}")
-        
-        time.sleep(0.3)
-        
-        # 2. 选择网点
-        self.log(f"[{user_name}] 📍 选择网点...")
-        
-        if use_cascader:
-            # 农业银行：级联选择
-            cascade_path = self.current_location.get("cascade_path", [])
-            if cascade_path:
-                for level, target_text in enumerate(cascade_path):
-                    self.log(f"[{user_name}]    [{level+1}/4] 正在选择: {target_text}")
-                    
-                    async def _select_level(level_idx, text):
-                        input_idx = 6 + level_idx
-                        box = await page.evaluate(f'''() => {{
-                            const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                            const target = inputs[{input_idx}];
-                            if(!target) return null;
-                            target.scrollIntoView({{block: 'center'}});
-                            const rect = target.getBoundingClientRect();
-                            return {{x: rect.x + rect.width/2, y: rect.y + rect.height/2}};
-                        }}''')
-                        
-                        if not box:
-                            return {"success": False, "msg": f"未找到第{level_idx+1}级输入框"}
-                        
-                        await page.mouse.click(box['x'], box['y'])
-                        await asyncio.sleep(0.3)
-                        
-                        result = await page.evaluate(f'''async () => {{
-                            const targetText = "{text}";
-                            await new Promise(r => setTimeout(r, 50));                             
-                            const selectors = ['li', '[role="menuitem"]', '.el-cascader-node', '.el-cascader-menu__item'];
-                            let found = false;
-                            let availableOptions = [];
-                            
-                            for(let sel of selectors) {{
-                                const options = document.querySelectorAll(sel);
-                                for(let opt of options) {{
-                                    const text = opt.textContent.trim();
-                                    // 收集可见选项用于调试
-                                    if(opt.offsetWidth > 0 && text) {{
-                                        availableOptions.push(text);
-                                    }}
-                                    
-                                    // 使用includes进行模糊匹配，更宽松
-                                    if(text.includes(targetText) && opt.offsetWidth > 0) {{
-                                        opt.scrollIntoView({{block: 'nearest'}});
-                                        await new Promise(r => setTimeout(r, 100));
-                                        opt.click();
-                                        found = true;
-                                        break;
-                                    }}
-                                }}
-                                if(found) break;
-                            }}
-                            
-                            if(!found) {{
-                                return {{
-                                    success: false, 
-                                    msg: '未找到选项',
-                                    available: availableOptions.slice(0, 10)  // 返回前10个可选项
-                                }};
-                            }}
-                            return {{success: true}};
-                        }}''')
-                        
-                        return result
-                    
-                    result = self._run_async(_select_level(level, target_text))
-                    
-                    if result.get("success"):
-                        self.log(f"[{user_name}]       ✅ 已选择: {target_text}")
-                        time.sleep(0.3)
-                    else:
-                        self.log(f"[{user_name}]       ❌ 失败: {result.get('msg', '未知错误')}")
-                        # 如果有可用选项信息，显示出来
-                        available = result.get('available', [])
-                        if available:
-                            self.log(f"[{user_name}]       💡 可选项: {', '.join(available[:5])}")
-                        break
-            
-            # 2.5 选择兑换日期（农业银行）
-            if use_cascader:
-                self.log(f"[{user_name}] 📅 选择兑换日期...")
-                
-                js_code_date = '''async () => {
-                    // 点击日期输入框（第11个）
-                    const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                    const dateInput = inputs[11];
-                    
-                    if (!dateInput) {
-                        return {success: false, msg: '未找到日期输入框'};
-                    }
-                    
-                    // 滚动到视图
-                    dateInput.scrollIntoView({block: 'center'});
-                    await new Promise(r => setTimeout(r, 200));
-                    
-                    // 使用focus()方法打开日期选择器
-                    dateInput.focus();
-                    await new Promise(r => setTimeout(r, 300));
-                    
-                    // 等待日期选择器出现
-                    let pickerOpened = false;
-                    for (let i = 0; i < 20; i++) {
-                        await new Promise(r => setTimeout(r, 100));
-                        const picker = document.querySelector('.el-date-picker, .el-picker-panel, .el-date-range-picker, [class*="date-picker"]');
-                        if (picker && picker.offsetWidth > 0) {
-                            pickerOpened = true;
-                            break;
-                        }
-                    }
-                    
-                    if (!pickerOpened) {
-                        return {success: false, msg: '日期选择器未打开'};
-                    }
-                    
-                    // 再等待一下确保日历完全渲染
-                    await new Promise(r => setTimeout(r, 300));
-                    
-                    // 查找所有日期单元格
-                    const allCells = document.querySelectorAll('.el-date-table td, .el-picker-panel__body td, [class*="date-table"] td');
-                    let found = false;
-                    let availableDates = [];
-                    
-                    for (let cell of allCells) {
-                        // 跳过完全禁用的单元格
-                        if (cell.classList.contains('disabled')) {
-                            continue;
-                        }
-                        
-                        // 获取单元格中的所有文本
-                        const cellText = cell.textContent.trim();
-                        
-                        // 尝试匹配20
-                        if (cellText === '20') {
-                            // 检查是否是本月的日期（不是上月或下月）
-                            if (!cell.classList.contains('prev-month') && 
-                                !cell.classList.contains('next-month')) {
-                                // 尝试点击
-                                cell.click();
-                                await new Promise(r => setTimeout(r, 200));
-                                found = true;
-                                break;
-                            }
-                        }
-                        
-                        // 收集可用日期
-                        if (!cell.classList.contains('prev-month') && 
-                            !cell.classList.contains('next-month') &&
-                            !cell.classList.contains('disabled')) {
-                            availableDates.push(cellText);
-                        }
-                    }
-                    
-                    if (found) {
-                        return {success: true, date: '2026-01-20'};
-                    } else {
-                        return {
-                            success: false, 
-                            msg: '未找到20号',
-                            available: availableDates
-                        };
-                    }
-                }'''
-                
-                try:
-                    date_result = self._run_async(page.evaluate(js_code_date))
-                    if date_result.get('success'):
-                        open_method = date_result.get('openMethod', '未知')
-                        self.log(f"[{user_name}]   ✅ 已选择: {date_result.get('date', '2026-01-20')} | 打开方式: {open_method}")
-                    else:
-                        self.log(f"[{user_name}]   ⚠️ 日期选择失败: {date_result.get('msg', '未知错误')}")
-                        open_method = date_result.get('openMethod', '')
-                        if open_method:
-                            self.log(f"[{user_name}]   ℹ️ 选择器打开方式: {open_method}")
-                        available = date_result.get('available', [])
-                        if available:
-                            self.log(f"[{user_name}]   💡 可选日期: {', '.join(available[:15])}")
-                        total = date_result.get('totalCells', 0)
-                        if total > 0:
-                            self.log(f"[{user_name}]   🔍 找到 {total} 个日期单元格")
-                except Exception as e:
-                    self.log(f"[{user_name}]   ⚠️ 日期选择出错: {e}")
-                    import traceback
-                    self.log(traceback.format_exc())
-                
-                time.sleep(0.3)
+            self.log(f"[{user_name}] ⚠️ 表单识别失败: {e}")
+            return None
+        
+        detection["url"] = page.url
+        bank = detection["bank"]
+        fingerprint = detection["fingerprint"]
+        if bank:
+            self.page_profiles[user_id] = detection
+            self.field_locator.store(page.url, fingerprint, detection["field_map"])
+            method = "已知布局" if detection["method"] == "fingerprint" else "标签匹配"
+            self.log(f"[{user_name}] 🏦 识别为{bank} ({method}, 指纹 {fingerprint})")
+            def switch_bank():
+                if bank != self.bank_var.get():
+                    self.bank_var.set(bank)
+                    self.store.set("bank", bank)
+                    self.update_location_display()
+            # 识别在事件循环线程中进行，界面切换交给主线程
+            self.status_bus.call_soon(switch_bank)
         else:
-            # 工商银行：独立下拉框
-            self._perform_icbc_location_selection(page, self.current_location.get("icbc_location", {}), field_indices, user_name)
+            field_count = len(detection["scan"]["fields"])
+            self.log(f"[{user_name}] ⚠️ 未识别的表单布局 (指纹 {fingerprint}, {field_count} 个输入框)，"
+                     f"已记录到 {self.profile_detector.capture_path}，按界面上选择的银行填写")
+        return detection
     
-    def _perform_icbc_location_selection(self, page, loc_data, indices, user_name):
-        """执行工商银行多下拉选择"""
-        targets = [
-            (indices.get('province', 3), loc_data.get('province'), '省份'),
-            (indices.get('city', 4), loc_data.get('city'), '城市'),
-            (indices.get('district', 5), loc_data.get('district'), '区县'),
-            (indices.get('outlet', 6), loc_data.get('outlet'), '网点')
-        ]
-        
-        js_code = f'''async () => {{
-            const logs = [];
-            const targets = {json.dumps(targets)};
-            
-            try {{
-                const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                
-                for (let [idx, val, name] of targets) {{
-                    if (!val) continue;
-                    
-                    const input = inputs[idx];
-                    if (!input) {{
-                        logs.push(`❌ 未找到输入框: ${{name}}`);
-                        continue;
-                    }}
-                    
-                    input.click();
-                    logs.push(`🔽 打开 ${{name}}`);
-                    await new Promise(r => setTimeout(r, 500));
-                    
-                    const options = document.querySelectorAll('.el-select-dropdown__item');
-                    let found = false;
-                    for (let opt of options) {{
-                        if (opt.textContent.trim() === val && opt.style.display !== 'none') {{
-                            opt.click();
-                            logs.push(`   ✅ 选择: ${{val}}`);
-                            found = true;
-                            break;
-                        }}
-                    }}
-                    
-                    if (!found) logs.push(`   ⚠️ 未找到选项: ${{val}}`);
-                    await new Promise(r => setTimeout(r, 500));
-                }}
-                return {{ success: true, logs: logs }};
-            }} catch (e) {{
-                return {{ success: false, logs: [e.message] }};
-            }}
-        }}'''
-        
-        result = self._run_async(page.evaluate(js_code))
-        for log in result['logs']:
-            self.log(f"[{user_name}] {log}")
-        
-    def _perform_icbc_location_selection_old(self, loc_data, indices):
-        """执行工商银行多下拉选择（旧版本，保留用于兼容）"""
-        # 注意：这个函数现在已被_perform_icbc_location_selection(page, loc_data, indices, user_name)替代
-        pass
-
-    def show_debug_info(self):
-        selection = self.user_listbox.curselection()
-        if not selection:
-            messagebox.showwarning("提示", "请先选择要使用的身份信息")
-            return
+    async def _perform_fill_for_page(self, page, user_data, user_name, timeline, inputs, bank=None):
+        """为指定页面执行自动填写（整套步骤一次注入页面执行，之后一次读回核对），返回填写结果；
+        inputs 为提交任务时在主线程读取的界面参数，bank 为空时使用其中选择的银行"""
+        current_bank = bank or inputs["bank"]
+        bank_config = self.config.get("bank_configs", {}).get(current_bank, {})
+        use_cascader = bank_config.get("use_cascader", True)
         
-        user_data = self.user_infos[selection[0]]
-        self.log(f"\n⚡ 开始自动填写 (用户: {user_data.get('name')})...")
-        self.fill_btn.config(state=tk.DISABLED)
+        if use_cascader and not self.current_location.get("cascade_path"):
+            self.log(f"[{user_name}] ⚠️ 未配置级联路径，跳过网点选择")
+        elif not use_cascader and not self.current_location.get("icbc_location"):
+            self.log(f"[{user_name}] ❌ 未配置网点信息")
         
-        Thread(target=self._integrated_fill_thread, args=(user_data,), daemon=True).start()
+        # 可选：采集填写期间的接口请求，与页面步骤耗时对照
+        collector = None
+        if self.config.get("settings", {}).get("capture_network"):
+            collector = NetworkCollector(page)
+            try:
+                await collector.start()
+            except Exception as e:
+                self.log(f"[{user_name}] ⚠️ 无法采集接口请求: {e}")
+                collector = None
         
-    def _integrated_fill_thread(self, user_data):
+        self.log(f"[{user_name}] 📝 执行填写计划...")
         try:
-            current_bank = self.bank_var.get()
-            bank_config = self.config.get("bank_configs", {}).get(current_bank, {})
-            field_indices = bank_config.get("field_indices", {})
-            use_cascader = bank_config.get("use_cascader", True)
-            
-            # 1. 填写基础信息
-            self.log("📝 步骤1: 填写基础信息...")
-            
-            js_code_fill = f'''() => {{
-                let filled = {{'name': false, 'id': false, 'phone': false, 'qty': false}};
-                let logs = [];
-                const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                
-                function fillByIndex(index, value, fieldName) {{
-                    if (inputs[index]) {{
-                        const input = inputs[index];
-                        input.focus();
-                        input.value = value;
-                        input.dispatchEvent(new Event('input', {{ bubbles: true }}));
-                        input.dispatchEvent(new Event('change', {{ bubbles: true }}));
-                        input.dispatchEvent(new Event('blur', {{ bubbles: true }}));
-                        if (input.value === value) {{
-                            logs.push(`✅ ${{fieldName}}: OK`);
-                            return true;
-                        }}
-                    }}
-                    logs.push(`⚠️ ${{fieldName}}: 失败`);
-                    return false;
-                }}
-                
-                filled.name = fillByIndex({field_indices.get('name', 0)}, '{user_data.get('name')}', '姓名');
-                filled.id = fillByIndex({field_indices.get('id_number', 1)}, '{user_data.get('id_number')}', '证件号');
-                filled.phone = fillByIndex({field_indices.get('phone', 2)}, '{user_data.get('phone')}', '手机');
-                filled.qty = fillByIndex({field_indices.get('quantity', 7)}, '{self.qty_entry.get()}', '数量');
-                
-                return {{ filled, logs }};
-            }}'''
-            
-            result_fill = self._run_async(self.page.evaluate(js_code_fill))
-            for log in result_fill['logs']:
-                self.log(f"  {log}")
-                
-            time.sleep(0.5)
-            
-            # 2. 选择网点
-            self.log(f"📍 步骤2: 选择网点 ({current_bank})...")
-            
-            if use_cascader:
-                # 农业银行：4个独立输入框，每个对应一级
-                self.log("   开始逐级选择网点...")
-                cascade_path = self.current_location.get("cascade_path", [])
-                
-                if not cascade_path:
-                    self.log("❌ 未配置级联路径")
-                else:
-                    for level, target_text in enumerate(cascade_path):
-                        self.log(f"   [{level+1}/4] 正在选择: {target_text}")
-                        
-                        async def _select_level(level_idx, text):
-                            # 点击对应级别的输入框
-                            input_idx = 6 + level_idx
-                            box = await self.page.evaluate(f'''() => {{
-                                const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                                const target = inputs[{input_idx}];
-                                if(!target) return null;
-                                target.scrollIntoView({{block: 'center'}});
-                                const rect = target.getBoundingClientRect();
-                                return {{x: rect.x + rect.width/2, y: rect.y + rect.height/2}};
-                            }}''')
-                            
-                            if not box:
-                                return {{"success": False, "msg": f"未找到第{level_idx+1}级输入框"}}
-                            
-                            # 物理点击
-                            await self.page.mouse.click(box['x'], box['y'])
-                            await asyncio.sleep(0.3)  # 等待面板打开
-                            
-                            # 在面板中查找并点击选项
-                            result = await self.page.evaluate(f'''async () => {{
-                                const targetText = "{text}";
-                                const logs = [];
-                                
-                                // 等待面板出现
-                                let panelFound = false;
-                                for(let i=0; i<20; i++) {{
-                                    const panels = document.querySelectorAll('[class*="dropdown"], [class*="cascader"]');
-                                    for(let p of panels) {{
-                                        const rect = p.getBoundingClientRect();
-                                        if(rect.width > 0 && rect.height > 0) {{
-                                            panelFound = true;
-                                            break;
-                                        }}
-                                    }}
-                                    if(panelFound) break;
-                                    await new Promise(r => setTimeout(r, 50));
-                                }}
-                                
-                                if(!panelFound) return {{success: false, msg: '面板未打开'}};
-                                
-                                await new Promise(r => setTimeout(r, 300));
-                                
-                                // 查找选项
-                                const selectors = ['li', '[role="menuitem"]', '.el-cascader-node'];
-                                let found = false;
-                                
-                                for(let sel of selectors) {{
-                                    const options = document.querySelectorAll(sel);
-                                    for(let opt of options) {{
-                                        if(opt.textContent.includes(targetText) && opt.offsetWidth > 0) {{
-                                            opt.click();
-                                            found = true;
-                                            break;
-                                        }}
-                                    }}
-                                    if(found) break;
-                                }}
-                                
-                                if(!found) return {{success: false, msg: '未找到选项'}};
-                                return {{success: true}};
-                            }}''')
-                            
-                            return result
-                        
-                        result = self._run_async(_select_level(level, target_text))
-                        
-                        if result.get("success"):
-                            self.log(f"      ✅ 已选择: {target_text}")
-                            # 等待一下让面板关闭
-                            import time
-                            time.sleep(0.3)
-                        else:
-                            self.log(f"      ❌ 失败: {result.get('msg', '未知错误')}")
-                            break
-            else:
-                self._perform_icbc_location_selection(self.page, self.current_location.get("icbc_location", {}), field_indices, user_data.get('name', '未知用户'))
-                
-            self.log("\n✅ 自动操作完成！")
-            
-        except Exception as e:
-            self.log(f"❌ 自动失败: {e}")
-            import traceback
-            self.log(traceback.format_exc())
+            with timeline.span("填写计划往返") as span:
+                result, elapsed = await perform_fill(
+                    page, bank_config, user_data, inputs["quantity"], self.current_location,
+                    timeout_ms=resolve_timeout(self.config), locator=self.field_locator,
+                    option_tree=self.option_tree, bank_name=current_bank, **resolve_fill_options(self.config)
+                )
         finally:
-            self.window.after(0, lambda: self.fill_btn.config(state=tk.NORMAL))
-
-    def _perform_cascader_selection(self, cascade_path):
-        """执行级联选择 (仅包含查找逻辑，点击已在外部执行)"""
-        # ... 原有的 JS 查找逻辑，去掉前面的点击部分 ...
-        
-        js_code = f'''async () => {{
-            const logs = [];
-            const cascadePath = {json.dumps(cascade_path)};
-            
-            try {{
-                // 检查面板是否打开 - 使用更宽松的检测
-                let panelFound = false;
-                let panelInfo = '';
-                
-                for(let i=0; i<30; i++) {{ 
-                    // 尝试多种选择器
-                    const selectors = [
-                        '.el-cascader-panel',
-                        '.el-cascader__dropdown', 
-                        '.el-cascader-menus',
-                        '.el-popper[role="tooltip"]',
-                        '[class*="cascader"]',
-                        '[class*="dropdown"]'
-                    ];
-                    
-                    for(let selector of selectors) {{
-                        const panels = document.querySelectorAll(selector);
-                        for(let p of panels) {{
-                            // 更宽松的判断：只要元素有宽高就算
-                            const rect = p.getBoundingClientRect();
-                            if(rect.width > 0 && rect.height > 0) {{
-                                panelFound = true;
-                                panelInfo = `发现面板: ${{selector}}, 尺寸: ${{rect.width}}x${{rect.height}}`;
-                                break;
-                            }}
-                        }}
-                        if(panelFound) break;
-                    }}
-                    if(panelFound) break;
-                    await new Promise(r => setTimeout(r, 100));
-                }}
-                
-                if(!panelFound) {{
-                     logs.push('❌ 物理点击后仍未检测到弹出层');
-                     // 调试信息：列出页面上所有可能是弹出层的元素
-                     const allEls = document.querySelectorAll('[class*="cascad"], [class*="dropdown"], [class*="popper"]');
-                     const info = Array.from(allEls).slice(0, 5).map(el => {{
-                         const rect = el.getBoundingClientRect();
-                         return `${{el.className}}: ${{rect.width}}x${{rect.height}}`;
-                     }});
-                     logs.push(`🔍 页面上的相关元素: ${{info.join(', ')}}`);
-                     return {{ success: false, logs: logs }};
-                }}
-                
-                logs.push(`✅ ${{panelInfo}}`);
-                
-                logs.push('✅ 面板已检测到，开始选择');
-                
-                // --- 查找选项逻辑 (同前) ---
-                const optionSelectors = [
-                    '.el-cascader-node', 
-                    'li[role="menuitem"]',
-                    '.el-scrollbar__view li',
-                    'li'
-                ];
-                
-                for (let level = 0; level < cascadePath.length; level++) {{
-                    const targetText = cascadePath[level];
-                    logs.push(`   正在查找: ${{targetText}}`);
-                    
-                    // 如果不是第一级，点击前一级后需要等待新的列出现
-                    if(level > 0) {{
-                        // 记录当前有多少个菜单列
-                        const beforeCount = document.querySelectorAll('.el-cascader-menu, .el-cascader-panel__wrap, [class*="cascader-menu"]').length;
-                        // 等待新列出现（最多等3秒）
-                        let newPanelAppeared = false;
-                        for(let wait=0; wait<30; wait++) {{
-                            await new Promise(r => setTimeout(r, 100));
-                            const afterCount = document.querySelectorAll('.el-cascader-menu, .el-cascader-panel__wrap, [class*="cascader-menu"]').length;
-                            if(afterCount > beforeCount) {{
-                                newPanelAppeared = true;
-                                logs.push(`   ↪ 第${{level+1}}级面板已加载`);
-                                break;
-                            }}
-                        }}
-                        if(!newPanelAppeared) {{
-                            // 即使没检测到新面板，也给500ms缓冲时间
-                            await new Promise(r => setTimeout(r, 500));
-                        }}
-                    }} else {{
-                        // 第一级直接等待800ms
-                        await new Promise(r => setTimeout(r, 800));
-                    }} 
-                    
-                    let found = false;
-                    let matchedEl = null;
-                    
-                    // 标准查找
-                    for (let sel of optionSelectors) {{
-                        const options = document.querySelectorAll(sel);
-                        for (let opt of options) {{
-                            if (opt.textContent.includes(targetText) && opt.offsetWidth > 0) {{
-                                matchedEl = opt;
-                                break;
-                            }}
-                        }}
-                        if (matchedEl) break;
-                    }}
-                    
-                    // 兜底查找
-                    if (!matchedEl) {{
-                         const walkers = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
-                         let node;
-                         while(node = walkers.nextNode()) {{
-                             if(node.textContent.includes(targetText)) {{
-                                 const p = node.parentElement;
-                                 if(p && p.offsetWidth > 0 && p.tagName !== 'SCRIPT' && p.tagName !== 'STYLE') {{
-                                     matchedEl = p;
-                                     const li = p.closest('li');
-                                     if(li) matchedEl = li;
-                                     break;
-                                 }}
-                             }}
-                         }}
-                    }}
-                    
-                    if (matchedEl) {{
-                        matchedEl.scrollIntoView({{block: "nearest"}});
-                        matchedEl.click();
-                        found = true;
-                        logs.push(`   ✅ 点击: ${{matchedEl.textContent.trim()}}`);
-                    }} else {{
-                        logs.push(`   ❌ 没找到: ${{targetText}}`);
-                        return {{ success: false, logs: logs }};
-                    }}
-                }}
-                return {{ success: true, logs: logs }};
-            }} catch (e) {{
-                return {{ success: false, logs: [`❌ JS错误: ${{e.message}}`] }};
-            }}
-        }}'''
-        
-        result = self._run_async(self.page.evaluate(js_code))
-        for log in result['logs']:
-            self.log(log)
-
-    def _perform_icbc_location_selection(self, page, loc_data, indices, user_name):
-        """执行工商银行多下拉选择"""
-        if not loc_data:
-            self.log(f"[{user_name}] ❌ 未配置网点信息")
-            return
-            
-        targets = [
-            (indices.get('province', 3), loc_data.get('province'), '省份'),
-            (indices.get('city', 4), loc_data.get('city'), '城市'),
-            (indices.get('district', 5), loc_data.get('district'), '区县'),
-            (indices.get('outlet', 6), loc_data.get('outlet'), '网点')
-        ]
-        
-        js_code = f'''async () => {{
-            const logs = [];
-            const targets = {json.dumps(targets)};
-            
-            try {{
-                const inputs = document.querySelectorAll('input.el-input__inner[type="text"]');
-                
-                for (let [idx, val, name] of targets) {{
-                    if (!val) continue;
-                    
-                    const input = inputs[idx];
-                    if (!input) {{
-                        logs.push(`❌ 未找到输入框: ${{name}}`);
-                        continue;
-                    }}
-                    
-                    input.click();
-                    logs.push(`🔽 打开 ${{name}}`);
-                    await new Promise(r => setTimeout(r, 500));
-                    
-                    const options = document.querySelectorAll('.el-select-dropdown__item');
-                    let found = false;
-                    for (let opt of options) {{
-                        if (opt.textContent.trim() === val && opt.style.display !== 'none') {{
-                            opt.click();
-                            logs.push(`   ✅ 选择: ${{val}}`);
-                            found = true;
-                            break;
-                        }}
-                    }}
-                    
-                    if (!found) logs.push(`   ⚠️ 未找到选项: ${{val}}`);
-                    await new Promise(r => setTimeout(r, 500));
-                }}
-                return {{ success: true, logs: logs }};
-            }} catch (e) {{
-                return {{ success: false, logs: [e.message] }};
-            }}
-        }}'''
-        
-        result = self._run_async(page.evaluate(js_code))
-        for log in result['logs']:
-            self.log(f"[{user_name}]   {log}")
+            if collector:
+                requests = await collector.stop()
+        timeline.add_page_steps(result, span["start_ms"])
+        if collector:
+            timeline.add_network(requests)
+            for line in format_network_summary(requests):
+                self.log(f"[{user_name}]   {line}")
+        
+        for line in format_fill_report(result):
+            self.log(f"[{user_name}]   {line}")
+        self.log(f"[{user_name}] ⏱️ 端到端耗时: {elapsed:.3f} 秒")
+        return result
 
     def show_debug_info(self):
         """显示选中用户的页面调试信息"""
@@ -1603,59 +1351,55 @@ class AutoFillerGUI:
             messagebox.showwarning("提示", "请先选择要调试的用户")
             return
         
-        user_index = int(selection[0])
-        if user_index not in self.page_instances:
+        user_id = selection[0]
+        if user_id not in self.page_instances:
             messagebox.showwarning("提示", "该用户尚未连接浏览器，请先连接")
             return
         
-        user_name = self.user_infos[user_index]['name']
-        page = self.page_instances[user_index]
+        user_name = self._user_name(user_id)
+        page = self.page_instances[user_id]
         
         self.log(f"🔍 [{user_name}] 正在获取页面元素...")
         
-        def _debug_thread():
+        async def _debug():
             try:
-                async def debug():
-                    # 获取所有输入框
-                    inputs = await page.evaluate('''() => {
-                        const result = {
-                            textInputs: [],
-                            checkboxes: [],
-                            selects: [],
-                            buttons: []
-                        };
-                        
-                        // 文本输入框
-                        document.querySelectorAll('input[type="text"], input.el-input__inner').forEach((el, i) => {
-                            result.textInputs.push(`[${i}] ${el.placeholder || el.name || '无标识'} | 值: ${el.value || '空'}`);
-                        });
-                        
-                        // 复选框
-                        document.querySelectorAll('input[type="checkbox"], .el-checkbox').forEach((el, i) => {
-                            const label = el.nextElementSibling?.textContent || el.parentElement?.textContent || '无标签';
-                            const checked = el.checked || el.classList.contains('is-checked');
-                            result.checkboxes.push(`[${i}] ${label.trim().substring(0, 50)} | 状态: ${checked ? '已勾选' : '未勾选'}`);
-                        });
-                        
-                        // 下拉框
-                        document.querySelectorAll('select, .el-select').forEach((el, i) => {
-                            const label = el.getAttribute('placeholder') || '无标识';
-                            result.selects.push(`[${i}] ${label}`);
-                        });
-                        
-                        // 按钮
-                        document.querySelectorAll('button').forEach((el, i) => {
-                            const text = el.textContent.trim();
-                            if (text) {
-                                result.buttons.push(`[${i}] ${text.substring(0, 30)}`);
-                            }
-                        });
-                        
-                        return result;
-                    }''')
-                    return inputs
+                # 获取所有输入框
+                result = await page.evaluate('''() => {
+                    const result = {
+                        textInputs: [],
+                        checkboxes: [],
+                        selects: [],
+                        buttons: []
+                    };
+                    
+                    // 文本输入框
+                    document.querySelectorAll('input[type="text"], input.el-input__inner').forEach((el, i) => {
+                        result.textInputs.push(`[${i}] ${el.placeholder || el.name || '无标识'} | 值: ${el.value || '空'}`);
+                    });
+                    
+                    // 复选框
+                    document.querySelectorAll('input[type="checkbox"], .el-checkbox').forEach((el, i) => {
+                        const label = el.nextElementSibling?.textContent || el.parentElement?.textContent || '无标签';
+                        const checked = el.checked || el.classList.contains('is-checked');
+                        result.checkboxes.push(`[${i}] ${label.trim().substring(0, 50)} | 状态: ${checked ? '已勾选' : '未勾选'}`);
+                    });
                     
-                result = self._run_async(debug())
+                    // 下拉框
+                    document.querySelectorAll('select, .el-select').forEach((el, i) => {
+                        const label = el.getAttribute('placeholder') || '无标识';
+                        result.selects.push(`[${i}] ${label}`);
+                    });
+                    
+                    // 按钮
+                    document.querySelectorAll('button').forEach((el, i) => {
+                        const text = el.textContent.trim();
+                        if (text) {
+                            result.buttons.push(`[${i}] ${text.substring(0, 30)}`);
+                        }
+                    });
+                    
+                    return result;
+                }''')
                 
                 self.log(f"[{user_name}] === 📝 文本输入框 ({len(result['textInputs'])}) ===")
                 for info in result['textInputs']:
@@ -1680,12 +1424,78 @@ class AutoFillerGUI:
                 import traceback
                 self.log(traceback.format_exc())
                 
-        Thread(target=_debug_thread, daemon=True).start()
+        self._submit(_debug())
+
 
+    def show_timing_panel(self):
+        """显示各用户最近一次填写的耗时分解"""
+        TimingPanelDialog(self.window, self.timing, self.status_bus)
 
+    def on_close(self):
+        """关闭窗口"""
+        if self.orchestrator:
+            self.orchestrator.cancel_all()
+            # 停止保活、释放所有连接并停止 Playwright 驱动，最多等待2秒
+            async def _shutdown():
+                await self.connection_manager.close()
+                await self.browser_pool.close()
+            try:
+                self.orchestrator.submit(_shutdown()).result(timeout=2)
+            except Exception:
+                pass
+        # 写入防抖周期内尚未保存的修改
+        try:
+            self.store.flush()
+        except Exception as e:
+            self.log(f"❌ 保存配置失败: {e}")
+        self.status_bus.stop()
+        self.log_sink.stop()
+        self.window.destroy()
+
+    def _mark_startup(self, name):
+        """记录启动阶段时刻（相对进程导入本模块的毫秒数）"""
+        self.startup_marks[name] = round((time.perf_counter() - STARTED_AT) * 1000, 1)
+    
+    async def _preload_driver(self):
+        """窗口显示后在后台导入 Playwright，首次连接时不再等待导入"""
+        await self.browser_pool.preload()
+        self._mark_startup("浏览器驱动就绪")
+    
+    async def _preload_pinyin(self):
+        """后台导入拼音词典（可选依赖），首次打开网点编辑框时不再等待导入"""
+        await asyncio.get_running_loop().run_in_executor(None, load_pinyin)
+    
+    def report_startup(self, budget_ms=0):
+        """启动耗时测量模式：窗口显示后输出各阶段耗时并关闭"""
+        self.window.update()
+        self._mark_startup("窗口显示")
+        try:
+            self.driver_future.result(timeout=30)
+        except Exception as e:
+            print(f"⚠️ 浏览器驱动预加载失败: {e}")
+        print("⏱️ 启动耗时 (ms):")
+        for name, ms in sorted(self.startup_marks.items(), key=lambda item: item[1]):
+            print(f"   {name:<12}{ms:>10}")
+        shown_ms = self.startup_marks["窗口显示"]
+        if budget_ms and shown_ms > budget_ms:
+            print(f"❌ 窗口显示耗时 {shown_ms}ms 超出预算 {budget_ms}ms")
+            self.exit_code = 1
+        self.on_close()
+        
     def run(self):
         self.window.mainloop()
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="纪念钞预约系统 - 图形界面")
+    parser.add_argument("--startup-time", action="store_true", help="测量启动各阶段耗时，窗口显示后输出并退出")
+    parser.add_argument("--budget-ms", type=float, default=0, help="配合 --startup-time：窗口显示耗时超过该值时返回非零退出码")
+    args = parser.parse_args()
+    
     app = AutoFillerGUI()
+    if args.startup_time:
+        app.window.after_idle(lambda: app.report_startup(args.budget_ms))
     app.run()
+    sys.exit(app.exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+填写速度基准测试
+在本地 HTTP 服务上提供离线模拟页 (fixtures/mock_reservation.html)，
+用无头 Chromium 反复执行图形界面与命令行两条填写路径，输出每一步耗时的 p50 / p95
+
+用法:
+    python benchmark.py                       # 农业银行布局，各跑 20 次
+    python benchmark.py --bank icbc --runs 50
+    python benchmark.py --json bench.json --budget-ms 1000
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import functools
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from playwright.async_api import async_playwright
+
+from auto_fill import BrowserConnector
+from dom_wait import resolve_timeout
+from fill_engine import perform_fill, resolve_fill_options
+from verify import format_verdict
+from locator import FieldLocator
+from option_tree import OptionTreeCache
+from config_store import read_config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BASE_DIR, "fixtures")
+FIXTURE_PAGE = "mock_reservation.html"
+BANK_NAMES = {"abc": "农业银行", "icbc": "工商银行"}
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    """在随机端口启动静态文件服务，返回 (server, 根地址)"""
+    handler = functools.partial(_QuietHandler, directory=FIXTURE_DIR)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(samples):
+    """{步骤: [毫秒...]} -> {步骤: {p50, p95, max, n}}"""
+    return {
+        step: {
+            "p50": round(percentile(values, 50), 1),
+            "p95": round(percentile(values, 95), 1),
+            "max": round(max(values), 1),
+            "n": len(values),
+        }
+        for step, values in samples.items()
+    }
+
+
+async def bench_gui_path(page, url, config, bank_name, runs):
+    """GUI 路径：与 AutoFillerGUI._perform_fill_for_page 相同的填写计划"""
+    bank_config = config.get("bank_configs", {}).get(bank_name, {})
+    user_data = config["user_infos"][0]
+    location = config.get("exchange_location", {})
+    timeout_ms = resolve_timeout(config)
+    # 不落盘的定位缓存和选项树：首轮扫描，之后命中缓存
+    locator = FieldLocator(cache_path=None)
+    option_tree = OptionTreeCache(cache_path=None)
+
+    samples = {}
+    failures = []
+    for run in range(runs):
+        await page.goto(url)
+        result, elapsed = await perform_fill(
+            page, bank_config, user_data, config.get("quantity", 20), location,
+            timeout_ms=timeout_ms, locator=locator, option_tree=option_tree, bank_name=bank_name,
+            **resolve_fill_options(config)
+        )
+        samples.setdefault("total", []).append(elapsed * 1000)
+        samples.setdefault("page_total", []).append(result.get("total_ms", 0))
+        for step in result.get("steps", []):
+            samples.setdefault(step["type"], []).append(step.get("ms", 0))
+            for level_idx, level in enumerate(step.get("levels", [])):
+                samples.setdefault(f"cascade.level{level_idx + 1}", []).append(level.get("ms", 0))
+            if not step.get("ok"):
+                failures.append({"run": run, "step": step["type"], "logs": step.get("logs", [])})
+        verification = result.get("verification")
+        if verification and not verification["ok"]:
+            failures.append({"run": run, "step": "verify", "logs": format_verdict(verification)})
+    return samples, failures
+
+
+async def bench_cli_path(page, url, config_path, runs):
+    """命令行路径：BrowserConnector.fill_form_ultra_fast"""
+    connector = BrowserConnector(config_path)
+    connector.page = page
+
+    samples = {}
+    failures = []
+    for run in range(runs):
+        await page.goto(url)
+        output = io.StringIO()
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            report = await connector.fill_form_ultra_fast()
+        samples.setdefault("total", []).append((time.perf_counter() - start_time) * 1000)
+        for span in report["steps"]:
+            samples.setdefault(span["name"], []).append(span["duration_ms"])
+        if not report["success"]:
+            failures.append({"run": run, "step": "total", "logs": report["failures"][:3]})
+    return samples, failures
+
+
+def print_report(name, summary, failures):
+    print(f"\n=== {name} ===")
+    print(f"{'步骤':<20}{'p50(ms)':>10}{'p95(ms)':>10}{'max(ms)':>10}{'n':>6}")
+    for step, stats in summary.items():
+        print(f"{step:<20}{stats['p50']:>10}{stats['p95']:>10}{stats['max']:>10}{stats['n']:>6}")
+    if failures:
+        print(f"⚠️ 失败 {len(failures)} 次，首个: {failures[0]}")
+
+
+async def run_benchmark(args):
+    config = read_config(args.config)
+    bank_name = BANK_NAMES[args.bank]
+
+    server, base_url = start_fixture_server()
+    url = f"{base_url}/{FIXTURE_PAGE}?bank={args.bank}&latency={args.latency}"
+    report = {"url": url, "runs": args.runs, "bank": bank_name, "paths": {}}
+
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch(headless=True)
+        page = await browser.new_page()
+        page.set_default_timeout(resolve_timeout(config))
+
+        paths = [("gui", "图形界面 _perform_fill_for_page", bench_gui_path(page, url, config, bank_name, args.runs))]
+        if not args.skip_cli:
+            paths.append(("cli", "命令行 fill_form_ultra_fast", bench_cli_path(page, url, args.config, args.runs)))
+
+        for key, name, coro in paths:
+            samples, failures = await coro
+            summary = summarize(samples)
+            print_report(name, summary, failures)
+            report["paths"][key] = {"summary": summary, "failures": failures}
+
+        await browser.close()
+    finally:
+        await playwright.stop()
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存: {args.json}")
+
+    gui_p95 = report["paths"]["gui"]["summary"]["total"]["p95"]
+    if args.budget_ms and gui_p95 > args.budget_ms:
+        print(f"\n❌ 图形界面路径 p95 {gui_p95}ms 超出预算 {args.budget_ms}ms")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="纪念钞预约填写速度基准测试")
+    parser.add_argument("--config", default=os.path.join(BASE_DIR, "config.json"), help="配置文件路径")
+    parser.add_argument("--bank", choices=sorted(BANK_NAMES), default="abc", help="模拟页布局")
+    parser.add_argument("--runs", type=int, default=20, help="每条路径的运行次数")
+    parser.add_argument("--latency", type=int, default=80, help="模拟下级选项接口延迟（毫秒）")
+    parser.add_argument("--json", help="把结果保存为 JSON 文件")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="图形界面路径 p95 总耗时预算，超出时返回非零退出码（0 表示不检查）")
+    parser.add_argument("--skip-cli", action="store_true", help="不运行命令行路径")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run_benchmark(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+浏览器连接池
+整个进程只启动一个 Playwright 驱动，按调试端口复用 CDP 连接，
+断开/关闭时统一释放连接并停止驱动；Playwright 在首次使用时才导入
+"""
+
+import asyncio
+from contextlib import contextmanager
+
+BASE_PORT = 9222
+
+
+def load_driver():
+    """导入 Playwright 并返回 async_playwright（导入较慢，不在模块加载时进行）"""
+    from playwright.async_api import async_playwright
+    return async_playwright
+
+
+class BrowserPool:
+    """共享 Playwright 驱动 + 按端口复用的 CDP 连接池"""
+
+    def __init__(self, host="localhost"):
+        self.host = host
+        self.browsers = {}  # {port: browser}
+        self.launched = []  # 本地启动的浏览器（无头回归模式）
+        self._playwright = None
+        self._start_lock = None  # 在事件循环线程中首次使用时创建，见 _get_start_lock
+        self._port_locks = {}
+
+    def endpoint(self, port):
+        return f"http://{self.host}:{port}"
+
+    def _get_start_lock(self):
+        """Python 3.8/3.9 的 asyncio.Lock 在创建时绑定当前线程的事件循环，
+        连接池在 Tk 主线程中创建，锁必须等到后台事件循环中第一次使用时再创建"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        return self._start_lock
+
+    async def _ensure_playwright(self):
+        async with self._get_start_lock():
+            if self._playwright is None:
+                # 预加载尚未完成时也在线程池中导入，不阻塞事件循环（已导入时立即返回）
+                async_playwright = await asyncio.get_running_loop().run_in_executor(None, load_driver)
+                self._playwright = await async_playwright().start()
+            return self._playwright
+
+    async def preload(self):
+        """在线程池中预先导入 Playwright，之后首次连接不再阻塞事件循环"""
+        await asyncio.get_running_loop().run_in_executor(None, load_driver)
+
+    async def connect(self, port):
+        """获取指定端口的浏览器连接，已连接则直接复用"""
+        lock = self._port_locks.setdefault(port, asyncio.Lock())
+        async with lock:
+            browser = self.browsers.get(port)
+            if browser and browser.is_connected():
+                return browser
+
+            playwright = await self._ensure_playwright()
+            browser = await playwright.chromium.connect_over_cdp(self.endpoint(port))
+            browser.on("disconnected", lambda b, p=port: self._forget(p, b))
+            self.browsers[port] = browser
+            return browser
+
+    async def launch(self, headless=True):
+        """用共享驱动在本地启动一个 Chromium（不经过调试端口），close() 时一并关闭"""
+        playwright = await self._ensure_playwright()
+        browser = await playwright.chromium.launch(headless=headless)
+        self.launched.append(browser)
+        return browser
+
+    async def get_page(self, port):
+        """连接指定端口并返回 (browser, 最后一个标签页)，没有页面时返回 (browser, None)"""
+        browser = await self.connect(port)
+        contexts = browser.contexts
+        if contexts and contexts[0].pages:
+            return browser, contexts[0].pages[-1]
+        return browser, None
+
+    async def release(self, port):
+        """断开指定端口的连接（不会关闭浏览器窗口本身）"""
+        browser = self.browsers.pop(port, None)
+        if browser and browser.is_connected():
+            await browser.close()
+
+    async def close(self):
+        """断开所有连接并停止 Playwright 驱动"""
+        ports = list(self.browsers.keys())
+        await asyncio.gather(*(self.release(port) for port in ports), return_exceptions=True)
+        launched, self.launched = self.launched, []
+        await asyncio.gather(*(browser.close() for browser in launched), return_exceptions=True)
+        async with self._get_start_lock():
+            if self._playwright is not None:
+                playwright, self._playwright = self._playwright, None
+                await playwright.stop()
+
+    def _forget(self, port, browser):
+        if self.browsers.get(port) is browser:
+            del self.browsers[port]
+
+
+class ConnectionManager:
+    """后台预连接各调试端口，定时心跳保活，掉线后按指数退避自动重连
+
+    状态变化时回调 on_change(port, state, page)，state 取值：
+    'connecting' 首次连接中 / 'connected' 已连接 / 'offline' 尚未连上 / 'reconnecting' 掉线重连中
+
+    页面导航、提交表单时心跳可能超时或遇到执行上下文重建，连续失败 heartbeat_failures 次
+    （或浏览器连接已断开、页面已关闭）才断开重连；hold(port) 期间暂停心跳
+    """
+
+    def __init__(self, pool, on_change, heartbeat_interval=5.0, heartbeat_timeout=2.0,
+                 min_backoff=1.0, max_backoff=30.0, heartbeat_failures=3):
+        self.pool = pool
+        self.on_change = on_change
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.heartbeat_failures = heartbeat_failures
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.pages = {}   # {port: page}
+        self.states = {}  # {port: state}
+        self._tasks = {}  # {port: keepalive task}
+        self._wakeups = {}
+        self._holds = {}  # {port: 占用页面的操作数}
+
+    def watch(self, port):
+        """开始在后台维护指定端口的连接（须在事件循环线程中调用）"""
+        task = self._tasks.get(port)
+        if task is None or task.done():
+            self._wakeups[port] = asyncio.Event()
+            self._tasks[port] = asyncio.ensure_future(self._keepalive(port))
+
+    async def unwatch(self, port):
+        """停止维护指定端口并断开连接"""
+        task = self._tasks.pop(port, None)
+        self._wakeups.pop(port, None)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.pages.pop(port, None)
+        self.states.pop(port, None)
+        await self.pool.release(port)
+
+    async def sync(self, ports):
+        """只维护给定的端口集合"""
+        for port in list(self._tasks):
+            if port not in ports:
+                await self.unwatch(port)
+        for port in ports:
+            self.watch(port)
+
+    async def ensure_page(self, port):
+        """返回可用页面；未连接时立即连接一次（不等待退避），失败抛出异常"""
+        self.watch(port)
+        page = self.pages.get(port)
+        if page is not None and not page.is_closed():
+            return page
+        browser, page = await self.pool.get_page(port)
+        if page is None:
+            raise RuntimeError(f"未找到页面 (端口:{port})")
+        self.pages[port] = page
+        self._set_state(port, 'connected', page)
+        # 唤醒保活任务，跳过剩余的退避等待
+        self._wakeups[port].set()
+        return page
+
+    @contextmanager
+    def hold(self, port):
+        """填写等操作占用页面期间暂停该端口的心跳，不会因心跳失败断开正在使用的连接（事件循环线程中使用）"""
+        self._holds[port] = self._holds.get(port, 0) + 1
+        try:
+            yield
+        finally:
+            self._holds[port] -= 1
+            if not self._holds[port]:
+                del self._holds[port]
+
+    def _alive(self, port, page):
+        """浏览器连接和页面本身是否仍然存在（心跳失败时据此区分真正掉线和暂时无响应）"""
+        browser = self.pool.browsers.get(port)
+        return browser is not None and browser.is_connected() and not page.is_closed()
+
+    def wake(self, port):
+        """端口刚启动就绪时调用：保活任务跳过剩余的退避等待，立即重试连接"""
+        wakeup = self._wakeups.get(port)
+        if wakeup is not None:
+            wakeup.set()
+
+    async def close(self):
+        for port in list(self._tasks):
+            await self.unwatch(port)
+
+    def _set_state(self, port, state, page=None):
+        if self.states.get(port) != state:
+            self.states[port] = state
+            self.on_change(port, state, page)
+
+    async def _sleep(self, port, seconds):
+        """等待指定秒数，期间可被 ensure_page 提前唤醒"""
+        wakeup = self._wakeups[port]
+        wakeup.clear()
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _keepalive(self, port):
+        backoff = self.min_backoff
+        failures = 0
+        self._set_state(port, 'connecting')
+        while True:
+            page = self.pages.get(port)
+            if page is None or page.is_closed():
+                try:
+                    browser, page = await self.pool.get_page(port)
+                    if page is None:
+                        raise RuntimeError("未找到页面")
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    was_connected = self.states.get(port) in ('connected', 'reconnecting')
+                    self._set_state(port, 'reconnecting' if was_connected else 'offline')
+                    await self._sleep(port, backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                self.pages[port] = page
+                self._set_state(port, 'connected', page)
+            backoff = self.min_backoff
+
+            if self._holds.get(port):
+                failures = 0
+                await self._sleep(port, self.heartbeat_interval)
+                continue
+
+            # 心跳：一次极小的 evaluate；连续失败多次或连接已断开才认为掉线
+            try:
+                await asyncio.wait_for(page.evaluate("1"), timeout=self.heartbeat_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                failures += 1
+                if failures < self.heartbeat_failures and self._alive(port, page):
+                    await self._sleep(port, self.min_backoff)
+                    continue
+                failures = 0
+                self.pages.pop(port, None)
+                await self.pool.release(port)
+                self._set_state(port, 'reconnecting')
+                continue
+            failures = 0
+            await self._sleep(port, self.heartbeat_interval)
@@ -0,0 +1,245 @@
+"""
+配置存储
+config.json 的读写集中在这里：读取时按结构校验并迁移旧格式（单个 user_info 字典），
+修改只在内存中标记脏字段，由后台定时器合并（防抖）后写入临时文件再原子替换，
+界面线程不做磁盘写入，程序异常退出时最多丢失最后一个防抖周期内的修改
+"""
+
+import os
+import copy
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import date
+
+from browser_pool import BASE_PORT
+from json_file import write_text_atomic
+
+DEFAULT_CONFIG_FILE = "config.json"
+DEFAULT_DEBOUNCE = 0.5  # 秒
+SCHEMA_VERSION = 1
+
+# 顶层字段 -> 默认值（类型即默认值的类型）
+DEFAULTS = {
+    "bank": "农业银行",
+    "bank_configs": {},
+    "user_infos": [],
+    "selected_user_index": 0,
+    "exchange_location": {},
+    "quantity": 20,
+    "target_date": "2026-01-20",
+    "target_url": "http://纪念钞.vip:8888/new-abchina",
+    "settings": {
+        "auto_submit": False,
+        "use_ocr": True,
+        "timeout": 5000,
+        "fill_mode": "component",
+    },
+}
+
+# 身份信息字段 -> 缺失时的默认值
+USER_FIELDS = {"name": "", "id_type": "身份证", "id_number": "", "phone": ""}
+
+
+def assign_identity(user, users):
+    """为身份信息分配稳定编号和调试端口（已有的保留），编号与列表位置无关，删除其他用户后不变"""
+    used_ids = {u.get("id") for u in users if u is not user}
+    used_ports = {u.get("port") for u in users if u is not user}
+    changed = False
+    if not user.get("id") or user["id"] in used_ids:
+        user["id"] = uuid.uuid4().hex[:8]
+        changed = True
+    if not isinstance(user.get("port"), int) or user["port"] in used_ports:
+        # 按位置分配时与旧版"第 N 个用户使用 9222+N"一致，冲突时取最小的空闲端口
+        position = next((i for i, u in enumerate(users) if u is user), len(users))
+        port = BASE_PORT + position
+        while port in used_ports:
+            port += 1
+        user["port"] = port
+        changed = True
+    return changed
+
+
+def migrate(data):
+    """校验并迁移配置，返回 (配置, 问题列表)；问题列表非空说明配置被修改过，需要写回"""
+    problems = []
+    data = dict(data) if isinstance(data, dict) else {}
+
+    # 旧版本只有单个 user_info 字典
+    legacy = data.pop("user_info", None)
+    if isinstance(legacy, dict) and not data.get("user_infos"):
+        data["user_infos"] = [legacy]
+        problems.append("已把旧版 user_info 迁移为 user_infos 列表")
+    elif legacy is not None:
+        problems.append("已移除旧版 user_info 字段")
+
+    for key, default in DEFAULTS.items():
+        if key not in data:
+            data[key] = copy.deepcopy(default)
+        elif not isinstance(data[key], type(default)) or isinstance(data[key], bool) != isinstance(default, bool):
+            problems.append(f"{key} 类型不正确，已恢复默认值")
+            data[key] = copy.deepcopy(default)
+
+    try:
+        date.fromisoformat(data["target_date"])
+    except ValueError:
+        problems.append("target_date 不是 YYYY-MM-DD 格式，已恢复默认值")
+        data["target_date"] = DEFAULTS["target_date"]
+
+    users = []
+    for user in data["user_infos"]:
+        if not isinstance(user, dict):
+            problems.append("已丢弃格式不正确的身份信息")
+            continue
+        users.append({**user, **{field: str(user.get(field) or default) for field, default in USER_FIELDS.items()}})
+    if any([assign_identity(user, users) for user in users]):
+        problems.append("已为身份信息分配稳定编号和调试端口")
+    data["user_infos"] = users
+    if not 0 <= data["selected_user_index"] < max(len(users), 1):
+        data["selected_user_index"] = 0
+
+    data["schema_version"] = SCHEMA_VERSION
+    return data, problems
+
+
+def read_config(path=DEFAULT_CONFIG_FILE):
+    """只读方式加载并迁移配置（命令行程序使用，不写回）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return migrate(json.load(f))[0]
+
+
+class ConfigStore:
+    """带脏标记和防抖写入的配置存储（线程安全）
+
+    self.data 为配置字典本身，可在任意线程读取；原地修改其中的列表/字典须放在 update(字段) 中，
+    修改期间持有存储锁，后台写盘不会序列化到修改了一半的数据
+    """
+
+    def __init__(self, path=DEFAULT_CONFIG_FILE, debounce=DEFAULT_DEBOUNCE, on_saved=None, on_error=None):
+        self.path = path
+        self.debounce = debounce
+        self.on_saved = on_saved
+        self.on_error = on_error
+        self.data = migrate({})[0]
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        self.read_only = False  # 原配置文件无法读取也无法备份时为真，不写盘以免覆盖
+        self.backup_path = None  # 损坏的配置文件改名后的路径
+
+    def load(self):
+        """读取配置文件，返回迁移过程中发现的问题；文件不存在时使用默认配置
+
+        文件内容损坏时先改名为 config.json.bak 再使用默认配置，之后的自动保存不会覆盖用户原来的文件；
+        文件存在但无法读取（或无法备份）时抛出 OSError，并停止自动保存
+        """
+        raw, damaged = {}, None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                if not isinstance(raw, dict):
+                    raise ValueError("顶层不是 JSON 对象")
+            except ValueError as e:
+                raw, damaged = {}, e
+            except OSError:
+                self.read_only = True
+                raise
+        problems = []
+        if damaged is not None:
+            try:
+                self.backup_path = self._backup()
+            except OSError:
+                self.read_only = True
+                raise
+            problems.append(f"{self.path} 无法解析 ({damaged})，已另存为 {self.backup_path}，改用默认配置")
+        data, migrated = migrate(raw)
+        problems.extend(migrated)
+        with self._lock:
+            self.data = data
+            self._dirty.clear()
+        if problems or data.get("schema_version") != raw.get("schema_version"):
+            self.mark_dirty("schema_version")
+        return problems
+
+    def _backup(self):
+        """把无法解析的配置文件改名保留，已有备份时加上时间戳，返回备份路径"""
+        backup = self.path + ".bak"
+        if os.path.exists(backup):
+            backup = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}.bak"
+        os.replace(self.path, backup)
+        return backup
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        """修改顶层字段，值有变化时才标记为脏"""
+        with self._lock:
+            if self.data.get(key) == value:
+                return
+            self.data[key] = value
+        self.mark_dirty(key)
+
+    @contextmanager
+    def update(self, key):
+        """原地修改字段，退出时标记为脏：
+
+            with store.update("user_infos") as users:
+                users.append(user)
+        """
+        with self._lock:
+            yield self.data[key]
+        self.mark_dirty(key)
+
+    def mark_dirty(self, key):
+        """标记字段已修改，并在防抖周期结束后写盘"""
+        with self._lock:
+            self._dirty.add(key)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def dirty(self):
+        with self._lock:
+            return set(self._dirty)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+
+    def flush(self):
+        """立即写入尚未保存的修改，没有修改时（或 read_only 时）不写盘；返回是否写入"""
+        if self.read_only:
+            return False
+        # 取快照和写盘在同一把写锁内，并发保存时不会用旧快照覆盖新文件
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return False
+                keys = set(self._dirty)
+                self._dirty.clear()
+                snapshot = json.dumps(self.data, ensure_ascii=False, indent=2)
+            try:
+                # 原子替换，写到一半退出也不会损坏原文件
+                write_text_atomic(self.path, snapshot)
+            except Exception:
+                with self._lock:
+                    self._dirty.update(keys)
+                raise
+        if self.on_saved:
+            self.on_saved(keys)
+        return True
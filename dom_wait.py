@@ -0,0 +1,81 @@
+"""
+DOM 就绪等待
+页面内基于 MutationObserver，页面外基于 Playwright 的 wait_for_selector，
+条件一满足立即继续，超时上限取自 config.json 的 settings.timeout
+"""
+
+DEFAULT_TIMEOUT_MS = 5000
+
+# Element UI 弹出层 / 级联菜单 / 日期表格的选择器
+POPPER_SELECTOR = '.el-popper, .el-select-dropdown, .el-cascader__dropdown'
+CASCADER_MENU_SELECTOR = '.el-cascader-menu, .el-cascader-panel'
+DATE_TABLE_SELECTOR = '.el-date-table, .el-picker-panel__body, [class*="date-table"]'
+FORM_INPUT_SELECTOR = 'input.el-input__inner'
+
+# 注入页面例程使用的等待函数，需要在调用方作用域内已定义 isVisible
+WAIT_HELPERS_JS = r'''
+    // 每次 DOM 变化（或过渡动画结束）时重新检查条件，满足即返回，超时返回 null
+    function waitFor(check, timeout) {
+        return new Promise(resolve => {
+            const first = check();
+            if (first) return resolve(first);
+            let done = false;
+            const recheck = () => {
+                if (done) return;
+                const value = check();
+                if (value) finish(value);
+            };
+            const observer = new MutationObserver(recheck);
+            const finish = value => {
+                if (done) return;
+                done = true;
+                observer.disconnect();
+                clearTimeout(timer);
+                document.removeEventListener('transitionend', recheck, true);
+                document.removeEventListener('animationend', recheck, true);
+                resolve(value);
+            };
+            observer.observe(document.documentElement, {
+                childList: true,
+                subtree: true,
+                attributes: true,
+                attributeFilter: ['style', 'class']
+            });
+            document.addEventListener('transitionend', recheck, true);
+            document.addEventListener('animationend', recheck, true);
+            const timer = setTimeout(() => finish(check() || null), timeout);
+        });
+    }
+
+    function firstVisible(selector) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (isVisible(el)) return el;
+        }
+        return null;
+    }
+
+    const waitVisible = (selector, timeout) => waitFor(() => firstVisible(selector), timeout);
+'''
+
+
+def resolve_timeout(config):
+    """从配置中读取等待上限（毫秒）"""
+    try:
+        timeout = int(config.get("settings", {}).get("timeout", DEFAULT_TIMEOUT_MS))
+    except (TypeError, ValueError):
+        return DEFAULT_TIMEOUT_MS
+    return timeout if timeout > 0 else DEFAULT_TIMEOUT_MS
+
+
+async def wait_for_visible(page, selector, timeout_ms=DEFAULT_TIMEOUT_MS):
+    """等待元素可见，成功返回 True，超时返回 False"""
+    try:
+        await page.wait_for_selector(selector, state="visible", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_form_ready(page, timeout_ms=DEFAULT_TIMEOUT_MS):
+    """等待预约表单渲染完成（出现可见的 Element UI 输入框）"""
+    return await wait_for_visible(page, FORM_INPUT_SELECTOR, timeout_ms)
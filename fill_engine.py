@@ -0,0 +1,704 @@
+"""
+填写计划引擎
+把一次填写需要的全部步骤编译成"填写计划"，作为一个异步例程一次性注入页面执行，
+页面内逐步完成并返回每一步的结果与耗时，避免多次 evaluate 往返和固定 sleep
+"""
+
+import time
+import uuid
+import asyncio
+from datetime import date
+from dom_wait import (
+    resolve_timeout, WAIT_HELPERS_JS, CASCADER_MENU_SELECTOR, DATE_TABLE_SELECTOR, POPPER_SELECTOR, DEFAULT_TIMEOUT_MS
+)
+from locator import FINGERPRINT_JS
+from page_scripts import SCRIPTS
+from option_tree import tree_key
+from verify import verify_fill, format_verdict
+
+DEFAULT_TARGET_DATE = "2026-01-20"
+DEFAULT_RETRIES = 1
+# 截止时间默认按 settings.timeout（单次等待的上限）推算：一步最多包含几次等待，整次填写包含多步、重试和核对
+STEP_DEADLINE_FACTOR = 2
+FILL_DEADLINE_FACTOR = 6
+
+# 通知页面内正在执行的填写例程停止
+ABORT_JS = "runId => { window.__autoFillAbort = runId; }"
+
+# 页面内执行的填写例程，参数为 build_fill_plan 生成的计划（以 JSON 形式传入，无需拼接字符串）
+FILL_PLAN_JS = r'''async (plan) => {
+    const planStart = performance.now();
+    // 开始时刻的墙上时间（毫秒），Python 侧据此把步骤对齐到填写时间线，与网络请求的时间可直接比较
+    const startedAt = Date.now();
+    const timeout = plan.timeout;
+    // 每一步有截止时间，步骤内的所有等待共用剩余时间；Python 侧取消或整体超时时写入 __autoFillAbort，
+    // 剩余等待立即结束，之后的步骤不再执行
+    let stepDeadline = Infinity;
+    const aborted = () => window.__autoFillAbort === plan.run_id;
+    const budget = () => aborted() ? 0 : Math.max(0, Math.min(timeout, stepDeadline - performance.now()));
+    const POPPER = plan.selectors.popper;
+    const CASCADER_MENU = plan.selectors.cascader_menu;
+    const DATE_TABLE = plan.selectors.date_table;
+    const textInputs = () => document.querySelectorAll('input.el-input__inner[type="text"]');
+    const isVisible = el => !!el && el.offsetWidth > 0 && el.offsetHeight > 0;
+''' + WAIT_HELPERS_JS + FINGERPRINT_JS + r'''
+    // 输入框所属的 Element UI 组件实例（Element UI 基于 Vue 2，组件根元素上有 __vue__），
+    // 多个组件共用同一根元素时沿 $parent 查找；未找到（非 Vue 页面或生产构建未暴露）返回 null
+    function ownerComponent(el, name) {
+        if (!plan.use_components) return null;
+        for (let node = el; node && node !== document.body; node = node.parentElement) {
+            for (let vm = node.__vue__; vm && vm.$el === node; vm = vm.$parent) {
+                if (vm.$options.name === name) return vm;
+            }
+        }
+        return null;
+    }
+
+    // 直接写组件绑定的数据（触发 v-model 的 input 事件），不经过 DOM 事件
+    function setModel(vm, value) {
+        vm.$emit('input', value);
+        vm.$emit('change', value);
+    }
+
+    // 按 el-date-picker 的 value-format 把日期转换为绑定值
+    function dateModelValue(vm, date) {
+        const format = vm.valueFormat;
+        if (!format) return date;
+        if (format === 'timestamp') return date.getTime();
+        const pad = n => String(n).padStart(2, '0');
+        return format
+            .replace('yyyy', date.getFullYear())
+            .replace('MM', pad(date.getMonth() + 1))
+            .replace('dd', pad(date.getDate()))
+            .replace('HH', '00').replace('mm', '00').replace('ss', '00');
+    }
+
+    function setInputValue(input, value) {
+        const vm = ownerComponent(input, 'ElInput');
+        if (vm) {
+            setModel(vm, value);
+            input.value = value;
+            return true;
+        }
+        input.focus();
+        input.value = value;
+        input.dispatchEvent(new Event('input', { bubbles: true }));
+        input.dispatchEvent(new Event('change', { bubbles: true }));
+        input.dispatchEvent(new Event('blur', { bubbles: true }));
+        return input.value === value;
+    }
+
+    // 模拟一次完整点击以打开下拉/级联面板
+    function openInput(input) {
+        input.scrollIntoView({ block: 'center' });
+        for (const type of ['mousedown', 'mouseup', 'click']) {
+            input.dispatchEvent(new MouseEvent(type, { bubbles: true, cancelable: true, view: window }));
+        }
+    }
+
+    const visibleContainers = () =>
+        Array.from(document.querySelectorAll(CASCADER_MENU + ', ' + POPPER)).filter(isVisible);
+
+    // 可见弹出层中的选项（已渲染完成的列表，加载中/无数据时为空），
+    // stale 为打开前就已可见的弹出层（上一级正在收起的下拉），其中的选项不算
+    function visibleOptions(stale) {
+        const options = [];
+        const seen = new Set();
+        for (const container of visibleContainers()) {
+            if (stale && stale.has(container)) continue;
+            for (const opt of container.querySelectorAll('.el-cascader-node, .el-cascader-menu__item, .el-select-dropdown__item, [role="menuitem"], li')) {
+                if (seen.has(opt) || !isVisible(opt)) continue;
+                seen.add(opt);
+                const text = opt.textContent.trim();
+                if (text) options.push({ el: opt, text: text });
+            }
+        }
+        return options;
+    }
+
+    // 选项匹配：优先完全相等；未经缓存确认的名称允许唯一的包含匹配，多个候选时不选，避免点错节点
+    function pickOption(options, target, exact) {
+        const equal = options.find(o => o.text === target);
+        if (equal || exact) return { option: equal || null, ambiguous: [] };
+        const partial = options.filter(o => o.text.includes(target));
+        if (partial.length === 1) return { option: partial[0], ambiguous: [] };
+        return { option: null, ambiguous: partial.map(o => o.text) };
+    }
+
+    // 日期输入框的显示值是否已是目标日期（兼容 2026-01-20 / 2026/1/20 / 2026年1月20日）
+    function showsDate(input, step) {
+        const parts = (input.value.match(/\d+/g) || []).map(Number);
+        return parts.length >= 3 && parts[0] === step.year && parts[1] === step.month && parts[2] === step.day;
+    }
+
+    // 每个步骤都是幂等的：先探测页面上的当前值，已是目标值的部分跳过（out.skipped 计数），
+    // 重试时只补做缺失的部分；级联/下拉只跳过从第一级开始连续正确的级别，因为重选上级会清空下级
+    const handlers = {
+        // 按索引填写文本字段
+        async inputs(step, out) {
+            const inputs = textInputs();
+            let ok = true;
+            out.mode = plan.use_components && inputs[0] && ownerComponent(inputs[0], 'ElInput') ? 'component' : 'events';
+            for (const field of step.fields) {
+                const input = inputs[field.index];
+                if (input && input.value === field.value) {
+                    out.skipped++;
+                    continue;
+                }
+                if (input && setInputValue(input, field.value)) {
+                    out.logs.push(`✅ ${field.label}: OK`);
+                } else {
+                    out.logs.push(`⚠️ ${field.label}: 失败`);
+                    ok = false;
+                }
+            }
+            return ok;
+        },
+
+        // 勾选所有未勾选的复选框（条款同意等）
+        async checkboxes(step, out) {
+            let count = 0;
+            document.querySelectorAll('input[type="checkbox"], .el-checkbox').forEach(el => {
+                if (el.tagName === 'INPUT' && !el.checked) {
+                    el.click();
+                    count++;
+                } else if (el.classList.contains('el-checkbox') && !el.classList.contains('is-checked')) {
+                    el.click();
+                    count++;
+                }
+            });
+            out.count = count;
+            out.logs.push(count > 0 ? `✅ 已勾选 ${count} 个选项` : 'ℹ️ 无需勾选');
+            return true;
+        },
+
+        // 农业银行：逐级选择网点（每一级一个 el-select），同时记录每一级的全部选项供缓存；
+        // 有组件实例时直接从选项数据中选择，否则点开输入框并点击选项
+        async cascade(step, out) {
+            out.levels = [];
+            let resuming = true;
+            for (let level = 0; level < step.path.length; level++) {
+                const targetText = step.path[level];
+                const exact = !!(step.exact && step.exact[level]);
+                const tag = `[${level + 1}/${step.path.length}]`;
+                const levelStart = performance.now();
+                const input = textInputs()[step.start_index + level];
+                if (!input) {
+                    out.logs.push(`❌ ${tag} 未找到第${level + 1}级输入框`);
+                    return false;
+                }
+                if (resuming && input.value === targetText) {
+                    out.levels.push({ wanted: targetText, text: targetText, options: [], skipped: true,
+                                      start_ms: Math.round(levelStart - planStart), ms: 0 });
+                    out.skipped++;
+                    continue;
+                }
+                resuming = false;
+                const vm = ownerComponent(input, 'ElSelect');
+                let options;
+                if (vm) {
+                    // 下一级选项由上一级的选择触发加载，等到选项数据中出现目标（或唯一的包含匹配）
+                    out.mode = 'component';
+                    const componentOptions = () => vm.options.filter(opt => !opt.disabled)
+                        .map(opt => ({ el: opt, text: String(opt.currentLabel).trim() }));
+                    await waitFor(() => pickOption(componentOptions(), targetText, exact).option, budget());
+                    options = componentOptions();
+                    if (!options.length) options = null;
+                } else {
+                    out.mode = out.mode || 'events';
+                    const stale = new Set(visibleContainers());
+                    openInput(input);
+                    options = await waitFor(() => {
+                        const found = visibleOptions(stale);
+                        return found.length ? found : null;
+                    }, budget());
+                }
+                if (!options) {
+                    out.logs.push(`❌ ${tag} 选项未加载: ${targetText}`);
+                    return false;
+                }
+                const picked = pickOption(options, targetText, exact);
+                const record = {
+                    wanted: targetText,
+                    text: picked.option ? picked.option.text : targetText,
+                    options: options.map(o => o.text),
+                    start_ms: Math.round(levelStart - planStart)
+                };
+                if (!picked.option) {
+                    record.ms = Math.round(performance.now() - levelStart);
+                    record.ok = false;
+                    out.levels.push(record);
+                    if (picked.ambiguous.length) {
+                        out.logs.push(`❌ ${tag} "${targetText}" 匹配到多个选项: ${picked.ambiguous.slice(0, 5).join(', ')}`);
+                    } else {
+                        out.logs.push(`❌ ${tag} 未找到选项: ${targetText}`);
+                        out.logs.push(`💡 可选项: ${record.options.slice(0, 5).join(', ')}`);
+                    }
+                    return false;
+                }
+                if (vm) {
+                    if (typeof vm.handleOptionSelect === 'function') vm.handleOptionSelect(picked.option.el);
+                    else setModel(vm, picked.option.el.value);
+                } else {
+                    picked.option.el.scrollIntoView({ block: 'nearest' });
+                    picked.option.el.click();
+                }
+                record.ms = Math.round(performance.now() - levelStart);
+                out.levels.push(record);
+                out.logs.push(record.text === targetText
+                    ? `✅ ${tag} 已选择: ${targetText}`
+                    : `✅ ${tag} 已选择: ${record.text} (配置为 ${targetText})`);
+            }
+            return true;
+        },
+
+        // 农业银行：优先直接写 el-date-picker 的绑定值，找不到组件时打开日期选择器并点击指定日
+        async date(step, out) {
+            const dateInput = textInputs()[step.index];
+            if (!dateInput) {
+                out.logs.push('⚠️ 未找到日期输入框');
+                return false;
+            }
+            if (showsDate(dateInput, step)) {
+                out.date = step.date;
+                out.skipped++;
+                return true;
+            }
+            const vm = ownerComponent(dateInput, 'ElDatePicker');
+            if (vm) {
+                out.mode = 'component';
+                const date = new Date(step.year, step.month - 1, step.day);
+                const disabledDate = vm.pickerOptions && vm.pickerOptions.disabledDate;
+                if (disabledDate && disabledDate(date)) {
+                    out.logs.push(`⚠️ ${step.date} 不可预约`);
+                    return false;
+                }
+                setModel(vm, dateModelValue(vm, date));
+                out.date = step.date;
+                out.logs.push(`✅ 已选择: ${step.date}`);
+                return true;
+            }
+
+            out.mode = 'events';
+            dateInput.scrollIntoView({ block: 'center' });
+            dateInput.focus();
+            openInput(dateInput);
+            const picker = await waitVisible(DATE_TABLE, budget());
+            if (!picker) {
+                out.logs.push('⚠️ 日期选择器未打开');
+                return false;
+            }
+            // 面板标题为 "2026 年 1 月"，不是目标月份时按月翻页
+            const header = Array.from(document.querySelectorAll('.el-date-picker__header')).find(isVisible);
+            const shown = header && header.textContent.match(/(\d{4})\s*年\s*(\d{1,2})\s*月/);
+            if (shown) {
+                const diff = (step.year - Number(shown[1])) * 12 + (step.month - Number(shown[2]));
+                const button = diff > 0 ? '.el-date-picker__next-btn.el-icon-arrow-right' : '.el-date-picker__prev-btn.el-icon-arrow-left';
+                for (let i = 0; i < Math.min(Math.abs(diff), 24); i++) {
+                    const el = Array.from(document.querySelectorAll(button)).find(isVisible);
+                    if (!el) break;
+                    const before = header.textContent;
+                    el.click();
+                    await waitFor(() => header.textContent !== before, budget());
+                }
+            }
+            const available = [];
+            const cells = document.querySelectorAll('.el-date-table td, .el-picker-panel__body td, [class*="date-table"] td');
+            for (const cell of cells) {
+                if (!isVisible(cell) ||
+                    cell.classList.contains('disabled') ||
+                    cell.classList.contains('prev-month') ||
+                    cell.classList.contains('next-month')) continue;
+                const cellText = cell.textContent.trim();
+                if (cellText === String(step.day)) {
+                    cell.click();
+                    out.date = step.date;
+                    out.logs.push(`✅ 已选择: ${step.date}`);
+                    return true;
+                }
+                available.push(cellText);
+            }
+            out.logs.push(`⚠️ 未找到${step.date}（${step.day}号不可选）`);
+            if (available.length) out.logs.push(`💡 可选日期: ${available.slice(0, 15).join(', ')}`);
+            return false;
+        },
+
+        // 工商银行：依次打开 el-select 并选择选项，同时记录每一级的全部选项供缓存
+        async selects(step, out) {
+            const inputs = textInputs();
+            let ok = true;
+            let resuming = true;
+            out.targets = [];
+            for (const target of step.targets) {
+                if (!target.value) continue;
+                const targetStart = performance.now();
+                const record = (found, options, skipped) => out.targets.push({
+                    text: target.label,
+                    value: target.value,
+                    options: options || [],
+                    skipped: !!skipped,
+                    start_ms: Math.round(targetStart - planStart),
+                    ms: Math.round(performance.now() - targetStart),
+                    ok: found
+                });
+                const input = inputs[target.index];
+                if (!input) {
+                    out.logs.push(`❌ 未找到输入框: ${target.label}`);
+                    record(false, null);
+                    ok = false;
+                    resuming = false;
+                    continue;
+                }
+                if (resuming && input.value === target.value) {
+                    out.skipped++;
+                    record(true, null, true);
+                    continue;
+                }
+                resuming = false;
+                // 有组件实例时直接从 el-select 的选项数据中选择（下一级选项加载完成即可选，无需展开下拉）
+                const vm = ownerComponent(input, 'ElSelect');
+                if (vm) {
+                    out.mode = 'component';
+                    const labelOf = opt => String(opt.currentLabel).trim();
+                    const option = await waitFor(() => vm.options.find(opt => labelOf(opt) === target.value && !opt.disabled), budget());
+                    if (option) {
+                        if (typeof vm.handleOptionSelect === 'function') vm.handleOptionSelect(option);
+                        else setModel(vm, option.value);
+                        out.logs.push(`✅ ${target.label}: ${target.value}`);
+                    } else {
+                        out.logs.push(`⚠️ 未找到选项: ${target.value}`);
+                        ok = false;
+                    }
+                    record(!!option, vm.options.map(labelOf));
+                    continue;
+                }
+                out.mode = out.mode || 'events';
+                openInput(input);
+                const option = await waitFor(() => {
+                    for (const opt of document.querySelectorAll('.el-select-dropdown__item')) {
+                        if (opt.textContent.trim() === target.value && opt.style.display !== 'none' && isVisible(opt)) return opt;
+                    }
+                    return null;
+                }, budget());
+                const options = Array.from(document.querySelectorAll('.el-select-dropdown__item'))
+                    .filter(opt => opt.style.display !== 'none' && isVisible(opt))
+                    .map(opt => opt.textContent.trim());
+                if (option) {
+                    option.click();
+                    out.logs.push(`✅ ${target.label}: ${target.value}`);
+                } else {
+                    out.logs.push(`⚠️ 未找到选项: ${target.value}`);
+                    ok = false;
+                }
+                record(!!option, options);
+            }
+            return ok;
+        }
+    };
+
+    if (!textInputs().length) await waitFor(() => textInputs().length > 0, timeout);
+
+    // 字段索引来自缓存时先核对布局指纹，布局已变化则不填写，交给调用方重新定位
+    if (plan.fingerprint) {
+        const fingerprint = layoutFingerprint();
+        if (fingerprint !== plan.fingerprint) {
+            return { success: false, stale: true, fingerprint: fingerprint, steps: [], started_at: startedAt,
+                     total_ms: Math.round(performance.now() - planStart) };
+        }
+    }
+
+    const steps = [];
+    for (const step of plan.steps) {
+        const out = { type: step.type, name: step.name, ok: false, skipped: 0, logs: [] };
+        const stepStart = performance.now();
+        if (aborted()) {
+            out.logs.push('⛔ 已取消');
+            out.start_ms = Math.round(stepStart - planStart);
+            out.ms = 0;
+            steps.push(out);
+            continue;
+        }
+        stepDeadline = stepStart + plan.step_timeout;
+        try {
+            out.ok = await handlers[step.type](step, out);
+        } catch (e) {
+            out.logs.push(`❌ JS错误: ${e.message}`);
+        }
+        if (!out.ok && performance.now() >= stepDeadline) {
+            out.timed_out = true;
+            out.logs.push(`⏰ 步骤超过 ${plan.step_timeout}ms 截止时间`);
+        }
+        out.start_ms = Math.round(stepStart - planStart);
+        out.ms = Math.round(performance.now() - stepStart);
+        steps.push(out);
+    }
+    return {
+        success: steps.every(s => s.ok),
+        aborted: aborted(),
+        skipped: steps.reduce((sum, s) => sum + s.skipped, 0),
+        steps: steps,
+        started_at: startedAt,
+        total_ms: Math.round(performance.now() - planStart)
+    };
+}'''
+
+
+def wanted_fields(bank_config):
+    """当前银行需要定位的逻辑字段"""
+    fields = set(bank_config.get("field_indices", {}))
+    if bank_config.get("use_cascader", True):
+        fields.add("date")
+    return fields
+
+
+def resolve_fill_options(config):
+    """从配置读取填写选项：兑换日期 (target_date, YYYY-MM-DD)、填写方式 (settings.fill_mode)
+    、失败后从断点继续的次数 (settings.fill_retries)、填写后是否核对 (settings.verify_after_fill)
+    以及每一步 / 整次填写的截止时间 (settings.step_timeout / settings.fill_timeout，毫秒)
+
+    fill_mode 为 "component"（默认）时直接写 Element UI 组件绑定的数据，找不到组件实例的字段
+    仍走 DOM 事件；为 "events" 时全部走 DOM 事件
+    """
+    settings = config.get("settings", {})
+    timeout = resolve_timeout(config)
+
+    def setting(name, default, minimum):
+        try:
+            value = int(settings.get(name, default))
+        except (TypeError, ValueError):
+            return default
+        return value if value >= minimum else default
+
+    return {
+        "target_date": config.get("target_date") or DEFAULT_TARGET_DATE,
+        "use_components": settings.get("fill_mode", "component") != "events",
+        "retries": setting("fill_retries", DEFAULT_RETRIES, 0),
+        "verify": settings.get("verify_after_fill", True),
+        "step_timeout_ms": setting("step_timeout", timeout * STEP_DEADLINE_FACTOR, 1),
+        "fill_timeout_ms": setting("fill_timeout", timeout * FILL_DEADLINE_FACTOR, 1),
+    }
+
+
+def build_fill_plan(bank_config, user_data, quantity, location, timeout_ms=DEFAULT_TIMEOUT_MS,
+                    field_map=None, fingerprint=None, cascade=None,
+                    target_date=DEFAULT_TARGET_DATE, use_components=True, step_timeout_ms=None, run_id=None):
+    """根据银行配置、用户信息和网点信息编译填写计划
+
+    field_map 为字段定位结果，覆盖配置中的 field_indices；fingerprint 为其对应的布局指纹；
+    cascade 为选项树解析后的 (级联路径, 每级是否已确认)，确认过的级别在页面内只做完全相等匹配；
+    target_date 为 YYYY-MM-DD 格式的兑换日期，格式不正确时抛出 ValueError；
+    step_timeout_ms 为每一步的截止时间，run_id 用于取消时通知页面内例程停止；
+    配置和定位结果中都没有索引的字段不猜测位置，不加入计划，记入 unresolved [(字段, 名称)]
+    """
+    day = date.fromisoformat(target_date)
+    indices = dict(bank_config.get("field_indices", {}))
+    indices.update(field_map or {})
+    use_cascader = bank_config.get("use_cascader", True)
+    unresolved = []
+
+    def resolved(key, label):
+        if indices.get(key) is None:
+            unresolved.append((key, label))
+            return False
+        return True
+
+    inputs = [
+        ("name", "姓名", user_data.get("name", "")),
+        ("id_number", "证件号", user_data.get("id_number", "")),
+        ("phone", "手机", user_data.get("phone", "")),
+        ("quantity", "数量", quantity),
+    ]
+    steps = [
+        {
+            "type": "inputs",
+            "name": "基础信息",
+            "fields": [{"key": key, "label": label, "index": indices[key], "value": str(value)}
+                       for key, label, value in inputs if resolved(key, label)],
+        },
+        {"type": "checkboxes", "name": "勾选条款"},
+    ]
+
+    if use_cascader:
+        cascade_path = location.get("cascade_path", [])
+        if cascade_path and resolved("cascader", "网点"):
+            path, exact = cascade or (list(cascade_path), [False] * len(cascade_path))
+            steps.append({
+                "type": "cascade",
+                "name": "选择网点",
+                "start_index": indices["cascader"],
+                "path": list(path),
+                "exact": list(exact),
+            })
+        if resolved("date", "兑换日期"):
+            steps.append({
+                "type": "date",
+                "name": "兑换日期",
+                "index": indices["date"],
+                "date": day.isoformat(),
+                "year": day.year,
+                "month": day.month,
+                "day": day.day,
+            })
+    else:
+        icbc = location.get("icbc_location", {})
+        if icbc:
+            targets = [("province", "省份"), ("city", "城市"), ("district", "区县"), ("outlet", "网点")]
+            steps.append({
+                "type": "selects",
+                "name": "选择网点",
+                "targets": [{"index": indices[key], "value": icbc.get(key), "label": label}
+                            for key, label in targets if icbc.get(key) and resolved(key, label)],
+            })
+
+    return {
+        "steps": steps,
+        "unresolved": unresolved,
+        "fingerprint": fingerprint,
+        "timeout": timeout_ms,
+        "step_timeout": step_timeout_ms or timeout_ms * STEP_DEADLINE_FACTOR,
+        "run_id": run_id,
+        "use_components": use_components,
+        "selectors": {
+            "popper": POPPER_SELECTOR,
+            "cascader_menu": CASCADER_MENU_SELECTOR,
+            "date_table": DATE_TABLE_SELECTOR,
+        },
+    }
+
+
+FILL_PLAN = SCRIPTS.register("fill_plan", FILL_PLAN_JS)
+
+
+async def run_fill_plan(page, plan):
+    """在页面中一次性执行填写计划，返回结构化结果；started_at 为本次执行开始的墙上时间（毫秒）"""
+    called_at = time.time() * 1000
+    result = await SCRIPTS.call(page, FILL_PLAN, plan)
+    result.setdefault("started_at", called_at)
+    return result
+
+
+def merge_options(option_tree, key, result):
+    """把一次填写中级联/下拉记录到的选项合并进选项树"""
+    for step in result.get("steps", []):
+        if step.get("type") == "cascade" and step.get("levels"):
+            option_tree.merge(key, step["levels"])
+        elif step.get("type") == "selects" and step.get("targets"):
+            option_tree.merge(key, [
+                {"text": t.get("value"), "options": t.get("options"), "ok": t.get("ok"), "skipped": t.get("skipped")}
+                for t in step["targets"]
+            ])
+
+
+async def abort_fill(page, run_id):
+    """通知页面内的填写例程停止（页面本身卡住时最多等待 1 秒，忽略错误）"""
+    try:
+        await asyncio.wait_for(page.evaluate(ABORT_JS, run_id), 1)
+    except Exception:
+        pass
+
+
+async def perform_fill(page, *args, fill_timeout_ms=None, **kwargs):
+    """编译并执行填写计划，返回 (结果, 端到端耗时秒)，参数见 _perform_fill
+
+    整次填写（含重新定位、重试和核对）超过 fill_timeout_ms 时抛出 asyncio.TimeoutError；
+    超时或任务被取消时通知页面内例程停止，不会在页面上继续点击
+    """
+    run_id = uuid.uuid4().hex[:8]
+    timeout = fill_timeout_ms / 1000 if fill_timeout_ms else None
+    try:
+        return await asyncio.wait_for(_perform_fill(page, *args, run_id=run_id, **kwargs), timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        asyncio.ensure_future(abort_fill(page, run_id))
+        raise
+
+
+async def _perform_fill(page, bank_config, user_data, quantity, location, timeout_ms=DEFAULT_TIMEOUT_MS,
+                        locator=None, option_tree=None, bank_name=None, retries=0, verify=False, **options):
+    """编译并执行填写计划
+
+    提供 locator 时按标签定位字段：缓存命中直接填写（一次往返），布局变化时重新定位后再填写；
+    提供 option_tree 时先用 站点 + bank_name 的选项树解析级联路径，填写后把本次看到的选项合并回去；
+    有步骤失败时最多再执行 retries 次，页面内会跳过已完成的部分，只补做缺失的步骤；
+    verify 为真时最后再读回整张表单与计划比对（一次往返），结果在 result["verification"]，不一致时 success 为假；
+    options 为 resolve_fill_options 返回的其余填写选项
+    """
+    start_time = time.perf_counter()
+    cascade, key = None, None
+    if option_tree:
+        key = tree_key(page.url, bank_name)
+    use_tree = key and bank_config.get("use_cascader", True) and location.get("cascade_path")
+    if use_tree:
+        cascade = option_tree.resolve_path(key, location["cascade_path"])
+    fingerprint, field_map, source = None, None, "config"
+    if locator:
+        fingerprint, field_map = locator.lookup(page.url)
+        source = "cache"
+        if field_map is None:
+            fingerprint, field_map = await locator.resolve(page, wanted_fields(bank_config))
+            source = "scan"
+
+    plan = build_fill_plan(bank_config, user_data, quantity, location, timeout_ms=timeout_ms,
+                           field_map=field_map, fingerprint=fingerprint, cascade=cascade, **options)
+    result = await run_fill_plan(page, plan)
+
+    if result.get("stale") and locator:
+        # 布局已变化：先查该布局是否解析过，否则重新扫描
+        fingerprint, field_map = locator.lookup(page.url, result["fingerprint"])
+        source = "cache"
+        if field_map is None:
+            fingerprint, field_map = await locator.resolve(page, wanted_fields(bank_config))
+            source = "scan"
+        plan = build_fill_plan(bank_config, user_data, quantity, location, timeout_ms=timeout_ms,
+                               field_map=field_map, fingerprint=fingerprint, cascade=cascade, **options)
+        result = await run_fill_plan(page, plan)
+
+    attempts = 1
+    while True:
+        if key:
+            merge_options(option_tree, key, result)
+        if result.get("success") or result.get("stale") or result.get("aborted") or attempts > retries:
+            break
+        # 从失败处继续：刚记录的选项可能让级联名称得到确认，重新解析后再执行同一计划
+        if use_tree:
+            cascade = option_tree.resolve_path(key, location["cascade_path"])
+        plan = build_fill_plan(bank_config, user_data, quantity, location, timeout_ms=timeout_ms,
+                               field_map=field_map, fingerprint=fingerprint, cascade=cascade, **options)
+        result = await run_fill_plan(page, plan)
+        attempts += 1
+
+    result["attempts"] = attempts
+    if plan["unresolved"]:
+        # 没有索引的字段未填写，不能算作完成
+        result["unresolved"] = plan["unresolved"]
+        result["success"] = False
+    if verify and not result.get("stale") and not result.get("aborted"):
+        result["verification"] = await verify_fill(page, plan, result)
+        result["success"] = result.get("success", False) and result["verification"]["ok"]
+    result["field_map"] = {"source": source, "fingerprint": fingerprint, "fields": field_map or {}}
+    return result, time.perf_counter() - start_time
+
+
+def format_fill_report(result):
+    """把填写结果整理为日志行"""
+    lines = []
+    field_map = result.get("field_map")
+    if field_map and field_map.get("source") != "config":
+        source = "缓存" if field_map["source"] == "cache" else "扫描"
+        fields = ", ".join(f"{k}={v}" for k, v in sorted(field_map["fields"].items()))
+        lines.append(f"📐 字段定位({source}): {fields or '无'}")
+    if result.get("unresolved"):
+        fields = ", ".join(f"{label}({key})" for key, label in result["unresolved"])
+        lines.append(f"❌ 未定位到字段，未填写: {fields}（请在 bank_configs 的 field_indices 中配置索引）")
+    for step in result.get("steps", []):
+        mark = "✅" if step.get("ok") else "⚠️"
+        mode = " 组件" if step.get("mode") == "component" else ""
+        skipped = f", 跳过 {step['skipped']} 项已完成" if step.get("skipped") else ""
+        lines.append(f"{mark} {step.get('name')} ({step.get('ms', 0)}ms{mode}{skipped})")
+        for log in step.get("logs", []):
+            lines.append(f"    {log}")
+    if result.get("verification"):
+        lines.extend(format_verdict(result["verification"]))
+    if result.get("attempts", 1) > 1:
+        lines.append(f"🔁 共执行 {result['attempts']} 次（后续各次跳过已完成的部分）")
+    lines.append(f"⏱️ 页面内总耗时: {result.get('total_ms', 0)}ms")
+    return lines
@@ -0,0 +1,32 @@
+"""
+JSON 文件读写
+配置、字段定位 / 选项树缓存、布局记录和状态文件共用：写入时先写同目录临时文件并 fsync，
+再原子替换，写到一半退出也不会留下损坏的文件；读取时文件不存在或内容损坏返回默认值
+"""
+
+import os
+import json
+
+
+def write_text_atomic(path, text):
+    """写临时文件并 fsync 后原子替换"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path, data):
+    """把 data 序列化为 JSON（保留中文，缩进 2）后原子写入"""
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def read_json(path, default=None):
+    """读取 JSON 文件，不存在或无法解析时返回 default"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
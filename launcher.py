@@ -0,0 +1,201 @@
+"""
+调试浏览器启动器
+在 Windows / Linux / macOS 上查找 Chrome、Chromium 或 Edge，按调试端口并发启动多个实例，
+逐个轮询 /json/version 直到端口真正可用，返回每个实例的启动耗时，端口一就绪即可开始连接
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import subprocess
+
+DEFAULT_READY_TIMEOUT = 15.0  # 秒
+POLL_INTERVAL = 0.05  # 秒
+PROFILE_PREFIX = "chrome_debug_profile"
+
+# 按优先级排列的候选浏览器：(显示名称, 安装路径 / PATH 中的命令名)
+WINDOWS_CANDIDATES = [
+    ("Chrome", r"%ProgramFiles%\Google\Chrome\Application\chrome.exe"),
+    ("Chrome", r"%ProgramFiles(x86)%\Google\Chrome\Application\chrome.exe"),
+    ("Chrome", r"%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"),
+    ("Edge", r"%ProgramFiles%\Microsoft\Edge\Application\msedge.exe"),
+    ("Edge", r"%ProgramFiles(x86)%\Microsoft\Edge\Application\msedge.exe"),
+]
+LINUX_CANDIDATES = [
+    ("Chrome", "google-chrome"),
+    ("Chrome", "google-chrome-stable"),
+    ("Chromium", "chromium"),
+    ("Chromium", "chromium-browser"),
+    ("Edge", "microsoft-edge"),
+    ("Edge", "microsoft-edge-stable"),
+]
+MAC_CANDIDATES = [
+    ("Chrome", "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"),
+    ("Chromium", "/Applications/Chromium.app/Contents/MacOS/Chromium"),
+    ("Edge", "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge"),
+]
+
+
+def browser_name(executable):
+    """按可执行文件名推断浏览器名称"""
+    lowered = os.path.basename(executable).lower()
+    if "edge" in lowered:
+        return "Edge"
+    if "chromium" in lowered:
+        return "Chromium"
+    return "Chrome"
+
+
+def find_browser(preferred=None):
+    """查找本机浏览器，返回 (名称, 可执行文件路径)，找不到返回 None
+
+    preferred 为配置中指定的路径或命令名（settings.browser_path），存在时优先使用
+    """
+    if preferred:
+        path = shutil.which(preferred) or (preferred if os.path.isfile(preferred) else None)
+        if path:
+            return browser_name(path), path
+
+    if sys.platform.startswith("win"):
+        for name, pattern in WINDOWS_CANDIDATES:
+            path = os.path.expandvars(pattern)
+            if "%" not in path and os.path.isfile(path):
+                return name, path
+    elif sys.platform == "darwin":
+        for name, path in MAC_CANDIDATES:
+            if os.path.isfile(path):
+                return name, path
+    # Linux 以及其它平台：按命令名在 PATH 中查找（Windows/macOS 也可能把浏览器加入 PATH）
+    for name, command in LINUX_CANDIDATES:
+        path = shutil.which(command)
+        if path:
+            return name, path
+    return None
+
+
+def profile_dir(port):
+    """每个调试端口使用独立的用户数据目录，同一端口重启后保留登录状态"""
+    return os.path.join(tempfile.gettempdir(), f"{PROFILE_PREFIX}_{port}")
+
+
+async def probe(port, host="127.0.0.1", timeout=1.0):
+    """请求一次 /json/version，端口可用时返回版本信息字典，否则返回 None
+
+    DevTools 的 HTTP 服务以 HTTP/1.1 + Content-Length 应答且不主动断开连接，
+    因此按响应头中的长度读取正文，不等待连接关闭
+    """
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET /json/version HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n"
+                     .encode("ascii"))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = status_line.split()
+        if len(status) < 2 or status[1] != "200":
+            return None
+        headers = {name.strip().lower(): value.strip()
+                   for name, _, value in (line.partition(":") for line in header_lines) if value}
+        if "content-length" in headers:
+            body = await asyncio.wait_for(reader.readexactly(int(headers["content-length"])), timeout)
+        else:
+            body = await asyncio.wait_for(reader.read(), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+    try:
+        return json.loads(body.decode("utf-8"))
+    except ValueError:
+        return None
+
+
+async def wait_until_ready(port, timeout=DEFAULT_READY_TIMEOUT, process=None, host="127.0.0.1"):
+    """轮询 /json/version 直到端口可用；进程提前退出或超时返回 None"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        info = await probe(port, host)
+        if info is not None:
+            return info
+        if process is not None and process.poll() is not None:
+            return None
+        if time.perf_counter() >= deadline:
+            return None
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+class BrowserLauncher:
+    """按调试端口并发启动浏览器实例
+
+    每个端口的结果为字典：
+    {"port", "ok", "reused"(端口已在使用，未重复启动), "ms"(启动到就绪的毫秒数), "browser"(版本), "error"}
+    """
+
+    def __init__(self, executable, name=None, extra_args=None, ready_timeout=DEFAULT_READY_TIMEOUT):
+        self.executable = executable
+        self.name = name or browser_name(executable)
+        self.extra_args = list(extra_args or [])
+        self.ready_timeout = ready_timeout
+        self.processes = {}  # {port: Popen}
+
+    @classmethod
+    def discover(cls, preferred=None, **kwargs):
+        """查找本机浏览器并创建启动器，找不到返回 None"""
+        found = find_browser(preferred)
+        if found is None:
+            return None
+        name, path = found
+        return cls(path, name, **kwargs)
+
+    def command(self, port, url=None):
+        cmd = [
+            self.executable,
+            f"--remote-debugging-port={port}",
+            f"--user-data-dir={profile_dir(port)}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--new-window",
+            *self.extra_args,
+        ]
+        if url:
+            cmd.append(url)
+        return cmd
+
+    async def launch(self, port, url=None, on_ready=None):
+        """启动一个实例并等待调试端口就绪；端口已可用时直接复用，不再启动新进程"""
+        start = time.perf_counter()
+        result = {"port": port, "ok": False, "reused": False, "ms": 0.0}
+        info = await probe(port)
+        if info is not None:
+            result.update(ok=True, reused=True, browser=info.get("Browser", ""))
+        else:
+            try:
+                process = subprocess.Popen(self.command(port, url), stdout=subprocess.DEVNULL,
+                                           stderr=subprocess.DEVNULL, shell=False)
+            except OSError as e:
+                result["error"] = str(e)
+                return result
+            self.processes[port] = process
+            info = await wait_until_ready(port, self.ready_timeout, process)
+            if info is not None:
+                result.update(ok=True, browser=info.get("Browser", ""))
+            elif process.poll() is not None:
+                result["error"] = f"浏览器进程已退出 (返回码 {process.returncode})"
+            else:
+                result["error"] = f"{self.ready_timeout:g} 秒内调试端口未就绪"
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if result["ok"] and on_ready is not None:
+            on_ready(port, result)
+        return result
+
+    async def launch_many(self, ports, url=None, on_ready=None):
+        """并发启动多个实例，返回 {port: 结果}；on_ready(port, 结果) 在每个端口就绪时立即回调"""
+        ports = list(ports)
+        results = await asyncio.gather(*(self.launch(port, url, on_ready) for port in ports))
+        return dict(zip(ports, results))
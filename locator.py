@@ -0,0 +1,138 @@
+"""
+字段定位
+一次 DOM 扫描，按表单项标签文字 / placeholder 把逻辑字段（姓名、证件号、手机、数量、网点、日期）
+解析为输入框索引；结果按页面地址 + 布局指纹缓存（内存 + 磁盘），之后的填写直接复用，
+只有页面布局指纹变化时才重新解析
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+from json_file import read_json, write_json_atomic
+from page_scripts import SCRIPTS
+
+DEFAULT_CACHE_FILE = "field_cache.json"
+
+# 页面内计算表单布局指纹：每个文本输入框的 标签|placeholder，取 djb2 哈希
+FINGERPRINT_JS = r'''
+    function fieldLabel(input) {
+        const item = input.closest('.el-form-item');
+        const labelEl = item ? item.querySelector('.el-form-item__label') : input.closest('label');
+        if (labelEl) return labelEl.textContent.trim();
+        const prev = input.closest('.el-input, .el-select, .el-cascader, .el-date-editor');
+        const sibling = (prev || input).previousElementSibling;
+        return sibling ? sibling.textContent.trim().slice(0, 20) : '';
+    }
+
+    function layoutFingerprint() {
+        const parts = [];
+        for (const input of document.querySelectorAll('input.el-input__inner[type="text"]')) {
+            parts.push(fieldLabel(input) + '|' + (input.placeholder || ''));
+        }
+        const text = parts.join('\n');
+        let hash = 5381;
+        for (let i = 0; i < text.length; i++) hash = ((hash * 33) ^ text.charCodeAt(i)) >>> 0;
+        return parts.length + '-' + hash.toString(16);
+    }
+'''
+
+SCAN_FIELDS_JS = r'''() => {
+''' + FINGERPRINT_JS + r'''
+    const fields = [];
+    document.querySelectorAll('input.el-input__inner[type="text"]').forEach((input, index) => {
+        fields.push({
+            index: index,
+            label: fieldLabel(input),
+            placeholder: input.placeholder || '',
+            readonly: input.readOnly
+        });
+    });
+    return { fingerprint: layoutFingerprint(), fields: fields };
+}'''
+SCAN_FIELDS = SCRIPTS.register("scan_fields", SCAN_FIELDS_JS)
+
+# 逻辑字段 -> 关键词（按优先级），先解析的字段先占用输入框
+FIELD_KEYWORDS = [
+    ("name", ["姓名", "名字"]),
+    ("id_number", ["证件号", "身份证号"]),
+    ("phone", ["手机", "电话"]),
+    ("quantity", ["数量"]),
+    ("date", ["日期", "兑换时间"]),
+    ("province", ["省份"]),
+    ("city", ["城市"]),
+    ("district", ["区县", "区/县"]),
+    ("outlet", ["网点"]),
+    ("cascader", ["省分行", "网点", "分行", "机构"]),
+]
+
+
+def resolve_fields(fields, wanted):
+    """根据扫描结果解析 wanted 中的逻辑字段，返回 {字段: 索引}"""
+    used = set()
+    resolved = {}
+    for key, keywords in FIELD_KEYWORDS:
+        if key not in wanted:
+            continue
+        for keyword in keywords:
+            match = next(
+                (f for f in fields
+                 if f["index"] not in used and (keyword in f["label"] or keyword in f["placeholder"])),
+                None
+            )
+            if match:
+                resolved[key] = match["index"]
+                used.add(match["index"])
+                break
+    return resolved
+
+
+def page_key(url):
+    """缓存用的页面地址（忽略查询参数和锚点）"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class FieldLocator:
+    """字段定位器：按页面地址 + 布局指纹缓存解析结果"""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_FILE):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self.cache = {}  # {页面地址: {"latest": 指纹, "layouts": {指纹: {字段: 索引}}}}
+        self._load()
+
+    def _load(self):
+        if self.cache_path:
+            self.cache = read_json(self.cache_path, {})
+
+    def _save(self):
+        if self.cache_path:
+            write_json_atomic(self.cache_path, self.cache)
+
+    def lookup(self, url, fingerprint=None):
+        """查缓存，返回 (指纹, {字段: 索引})；未命中返回 (None, None)"""
+        with self._lock:
+            entry = self.cache.get(page_key(url))
+            if not entry:
+                return None, None
+            fingerprint = fingerprint or entry.get("latest")
+            field_map = entry.get("layouts", {}).get(fingerprint)
+            return (fingerprint, dict(field_map)) if field_map is not None else (None, None)
+
+    def store(self, url, fingerprint, field_map):
+        """写入缓存并设为该页面的当前布局"""
+        with self._lock:
+            entry = self.cache.setdefault(page_key(url), {"latest": None, "layouts": {}})
+            entry["latest"] = fingerprint
+            entry["layouts"][fingerprint] = field_map
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    async def resolve(self, page, wanted):
+        """扫描页面并解析字段，写入缓存，返回 (指纹, {字段: 索引})"""
+        scan = await SCRIPTS.call(page, SCAN_FIELDS)
+        field_map = resolve_fields(scan["fields"], wanted)
+        self.store(page.url, scan["fingerprint"], field_map)
+        return scan["fingerprint"], field_map
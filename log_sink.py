@@ -0,0 +1,96 @@
+"""
+日志输出管道
+工作线程只负责把日志放进队列，由 Tk 主循环定时批量取出写入日志框，
+日志框保留行数有上限，可选同时镜像到按大小滚动的日志文件
+"""
+
+import os
+import queue
+import logging
+import logging.handlers
+import tkinter as tk
+
+DEFAULT_INTERVAL_MS = 50
+DEFAULT_MAX_LINES = 2000
+
+
+class LogSink:
+    """线程安全、批量刷新的日志输出"""
+
+    def __init__(self, window, text_widget, interval_ms=DEFAULT_INTERVAL_MS, max_lines=DEFAULT_MAX_LINES):
+        self.window = window
+        self.text_widget = text_widget
+        self.interval_ms = interval_ms
+        self.max_lines = max_lines
+        self.queue = queue.SimpleQueue()
+        self.file_logger = None
+        self.file_listener = None
+        self._after_id = None
+
+    def write(self, message):
+        """写入一条日志，可在任意线程调用"""
+        self.queue.put(message)
+        if self.file_logger:
+            self.file_logger.info(message)
+
+    def start(self):
+        """开始定时刷新"""
+        if self._after_id is None:
+            self._after_id = self.window.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """停止刷新并关闭文件镜像"""
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        self._drain_once()
+        self.close_file()
+
+    def enable_file(self, path, max_bytes=1024 * 1024, backup_count=3):
+        """开启日志文件镜像，文件写入在独立线程中完成"""
+        self.close_file()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        log_queue = queue.SimpleQueue()
+        self.file_listener = logging.handlers.QueueListener(log_queue, handler)
+        self.file_listener.start()
+
+        logger = logging.getLogger("auto_fill_gui")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+        self.file_logger = logger
+
+    def close_file(self):
+        if self.file_listener:
+            self.file_listener.stop()
+            self.file_listener = None
+        if self.file_logger:
+            self.file_logger.handlers = []
+            self.file_logger = None
+
+    def _drain(self):
+        self._drain_once()
+        self._after_id = self.window.after(self.interval_ms, self._drain)
+
+    def _drain_once(self):
+        lines = []
+        while True:
+            try:
+                lines.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if not lines:
+            return
+
+        self.text_widget.insert(tk.END, "\n".join(lines) + "\n")
+        # 超出保留上限时删除最早的行（末尾有一个空行）
+        line_count = int(self.text_widget.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            self.text_widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        self.text_widget.see(tk.END)
@@ -0,0 +1,114 @@
+"""
+网络请求耗时采集
+填写期间通过 CDP Network 域记录页面发出的 XHR / fetch 请求（地址、开始时间、首字节时间、总耗时、大小），
+按墙上时间换算到填写时间线上，和页面内各步骤的耗时放在一起，区分"在等接口"和"在等页面"
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+CAPTURE_TYPES = ("XHR", "Fetch")
+DETACH_TIMEOUT = 1.0  # 秒
+
+
+def short_url(url, limit=60):
+    """只保留路径和查询串，便于在面板中显示"""
+    parts = urlsplit(url)
+    text = parts.path + (f"?{parts.query}" if parts.query else "")
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class NetworkCollector:
+    """一次填写期间的接口请求记录器（启用 CDP Network 域，结束时断开会话）
+
+    每个请求记录为：
+    {"url", "method", "status", "wall_time"(发出时刻, 秒), "ttfb_ms", "duration_ms", "size", "ok", "pending"}
+    """
+
+    def __init__(self, page, types=CAPTURE_TYPES):
+        self.page = page
+        self.types = types
+        self.session = None
+        self._requests = {}  # {requestId: 记录}
+        self._started = {}   # {requestId: 发出时的 CDP 单调时间戳}
+
+    async def start(self):
+        self.session = await self.page.context.new_cdp_session(self.page)
+        self.session.on("Network.requestWillBeSent", self._on_request)
+        self.session.on("Network.responseReceived", self._on_response)
+        self.session.on("Network.loadingFinished", self._on_finished)
+        self.session.on("Network.loadingFailed", self._on_failed)
+        await self.session.send("Network.enable")
+
+    async def stop(self):
+        """断开 CDP 会话，返回按发出时间排序的请求记录；未完成的请求 pending 为真"""
+        if self.session is not None:
+            session, self.session = self.session, None
+            try:
+                await asyncio.wait_for(session.detach(), DETACH_TIMEOUT)
+            except Exception:
+                pass
+        return sorted(self._requests.values(), key=lambda r: r["wall_time"])
+
+    def _on_request(self, params):
+        if params.get("type") not in self.types:
+            return
+        request_id = params["requestId"]
+        request = params.get("request", {})
+        self._started[request_id] = params["timestamp"]
+        self._requests[request_id] = {
+            "url": request.get("url", ""),
+            "method": request.get("method", "GET"),
+            "status": None,
+            "wall_time": params.get("wallTime", 0),
+            "ttfb_ms": None,
+            "duration_ms": None,
+            "size": 0,
+            "ok": False,
+            "pending": True,
+        }
+
+    def _on_response(self, params):
+        record = self._requests.get(params["requestId"])
+        if record is None:
+            return
+        response = params.get("response", {})
+        record["status"] = response.get("status")
+        timing = response.get("timing")
+        if timing and timing.get("receiveHeadersEnd", -1) >= 0 and timing.get("sendStart", -1) >= 0:
+            # 发出请求到收到响应头，即服务端处理 + 网络往返
+            record["ttfb_ms"] = round(timing["receiveHeadersEnd"] - timing["sendStart"], 1)
+        else:
+            record["ttfb_ms"] = round((params["timestamp"] - self._started[params["requestId"]]) * 1000, 1)
+
+    def _on_finished(self, params):
+        record = self._requests.get(params["requestId"])
+        if record is None:
+            return
+        record["duration_ms"] = round((params["timestamp"] - self._started[params["requestId"]]) * 1000, 1)
+        record["size"] = int(params.get("encodedDataLength", 0))
+        record["ok"] = record["status"] is not None and record["status"] < 400
+        record["pending"] = False
+
+    def _on_failed(self, params):
+        record = self._requests.get(params["requestId"])
+        if record is None:
+            return
+        record["duration_ms"] = round((params["timestamp"] - self._started[params["requestId"]]) * 1000, 1)
+        record["error"] = params.get("errorText", "")
+        record["pending"] = False
+
+
+def format_network_summary(requests):
+    """请求记录整理为日志行：合计一行，最慢的几个请求各一行"""
+    finished = [r for r in requests if not r["pending"]]
+    if not requests:
+        return ["🌐 填写期间没有接口请求"]
+    waits = sum(r["ttfb_ms"] or 0 for r in finished)
+    lines = [f"🌐 接口请求 {len(requests)} 个，服务端等待合计 {waits:.0f}ms"
+             + (f"，{len(requests) - len(finished)} 个未完成" if len(finished) < len(requests) else "")]
+    for r in sorted(finished, key=lambda r: r["duration_ms"] or 0, reverse=True)[:3]:
+        mark = "✅" if r["ok"] else "❌"
+        lines.append(f"    {mark} {r['method']} {short_url(r['url'])}: 首字节 {r['ttfb_ms'] or 0:.0f}ms, "
+                     f"共 {r['duration_ms']:.0f}ms, {r['size']} B")
+    return lines
@@ -0,0 +1,93 @@
+"""
+网点选项树缓存
+级联/下拉选择时页面例程会返回每一级展开后的全部选项，按 站点 + 银行 合并成一棵
+省分行 → 市分行 → 支行 → 营业室（工商银行为 省 → 市 → 区县 → 网点）的选项树并落盘；下次填写前先用选项树把配置的
+级联路径解析为页面上的准确名称，页面内按完全相等匹配，不再做可能点错节点的模糊匹配
+"""
+
+import threading
+from urllib.parse import urlsplit
+
+from json_file import read_json, write_json_atomic
+
+DEFAULT_CACHE_FILE = "option_tree_cache.json"
+
+
+def tree_key(url, bank_name):
+    """缓存键：站点（协议 + 主机）+ 银行名称"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}|{bank_name}"
+
+
+def match_option(options, wanted):
+    """在选项列表中找 wanted：完全相等优先，否则取唯一的包含匹配，找不到或有歧义返回 None"""
+    if wanted in options:
+        return wanted
+    partial = [text for text in options if wanted in text]
+    return partial[0] if len(partial) == 1 else None
+
+
+class OptionTreeCache:
+    """按 站点 + 银行 保存级联选项树（内存 + 磁盘）
+
+    节点结构：{"options": [本级全部选项], "children": {选项: 下一级节点}}
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE_FILE):
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self.trees = {}  # {缓存键: 根节点}
+        self._load()
+
+    def _load(self):
+        if self.cache_path:
+            self.trees = read_json(self.cache_path, {})
+
+    def _save(self):
+        if self.cache_path:
+            write_json_atomic(self.cache_path, self.trees)
+
+    def trees_for(self, bank_name):
+        """该银行在所有站点上的选项树"""
+        suffix = f"|{bank_name}"
+        with self._lock:
+            return [tree for key, tree in self.trees.items() if key.endswith(suffix)]
+
+    def resolve_path(self, key, path):
+        """把配置的级联路径解析为页面上的准确名称
+
+        返回 (路径, 每一级是否已由缓存确认)；缓存确认的级别在页面内只做完全相等匹配，
+        未确认的级别保留原名称，由页面内做唯一包含匹配
+        """
+        resolved, exact = [], []
+        with self._lock:
+            node = self.trees.get(key)
+            for wanted in path:
+                text = match_option(node["options"], wanted) if node else None
+                resolved.append(text or wanted)
+                exact.append(text is not None)
+                node = node["children"].get(text) if node and text else None
+        return resolved, exact
+
+    def merge(self, key, levels):
+        """合并一次级联选择记录到的选项，levels 为 [{"text": 选中项, "options": [...]}]
+
+        skipped 的级别（页面上已是目标值，未展开）没有选项，只沿 text 向下
+        """
+        changed = False
+        with self._lock:
+            node = self.trees.setdefault(key, {"options": [], "children": {}})
+            for level in levels:
+                options = level.get("options") or []
+                if options and options != node["options"]:
+                    node["options"] = options
+                    changed = True
+                if not level.get("ok", True) or not (level.get("skipped") or level.get("text") in options):
+                    break
+                node = node["children"].setdefault(level["text"], {"options": [], "children": {}})
+            if changed:
+                try:
+                    self._save()
+                except OSError:
+                    pass
+        return changed
@@ -0,0 +1,110 @@
+"""
+离线网点目录
+由填写时采集的选项树 (option_tree_cache.json) 生成，按银行汇总所有站点的网点路径，
+对网点名称和拼音首字母建立有序前缀索引，网点编辑框据此即时补全和校验，无需打开浏览器
+（拼音首字母需要可选依赖 pypinyin，未安装时只按汉字前缀检索；其词典较大，首次使用时才导入）
+"""
+
+import bisect
+
+MAX_RESULTS = 50
+PATH_DEPTH = 4  # 两家银行的网点路径都是四级
+
+_pinyin = None  # 导入后为 (lazy_pinyin, Style)，未安装时为 False
+
+
+def load_pinyin():
+    """导入可选依赖 pypinyin，返回 (lazy_pinyin, Style)，未安装返回 None；可在后台线程预先调用"""
+    global _pinyin
+    if _pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin, Style
+            _pinyin = (lazy_pinyin, Style)
+        except ImportError:  # 可选依赖
+            _pinyin = False
+    return _pinyin or None
+
+
+def initials(text):
+    """汉字转拼音首字母（小写），未安装 pypinyin 时返回空字符串"""
+    pinyin = load_pinyin()
+    if pinyin is None:
+        return ""
+    lazy_pinyin, Style = pinyin
+    return "".join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors="ignore")).lower()
+
+
+class OutletCatalog:
+    """某家银行的网点目录：完整路径列表 + 名称/首字母前缀索引 + 逐级选项"""
+
+    def __init__(self, trees=None):
+        self.trees = trees or []
+        self._keys = []   # 有序 [(检索键, 路径序号)]
+        paths = set()
+        for tree in self.trees:
+            self._collect(tree, (), paths)
+        self.paths = sorted(paths)  # [(第一级, 第二级, 第三级, 网点)]
+        for idx, path in enumerate(self.paths):
+            outlet = path[-1]
+            keys = {outlet, initials(outlet)}
+            keys.update(level for level in path[:-1])
+            for key in keys:
+                if key:
+                    self._keys.append((key.lower(), idx))
+        self._keys.sort()
+
+    @classmethod
+    def from_option_tree(cls, option_tree, bank_name):
+        """汇总 OptionTreeCache 中该银行所有站点的选项树"""
+        return cls(option_tree.trees_for(bank_name))
+
+    def _collect(self, node, prefix, paths):
+        for option in node.get("options", []):
+            path = prefix + (option,)
+            child = node.get("children", {}).get(option)
+            if len(path) == PATH_DEPTH:
+                paths.add(path)
+            elif child:
+                self._collect(child, path, paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def search(self, query, limit=MAX_RESULTS):
+        """按网点名称/上级名称/拼音首字母前缀检索，不足时补充名称包含匹配，返回路径列表"""
+        query = query.strip().lower()
+        if not query:
+            return self.paths[:limit]
+        found = {}  # 按命中顺序去重
+        start = bisect.bisect_left(self._keys, (query,))
+        for pos in range(start, len(self._keys)):
+            key, idx = self._keys[pos]
+            if not key.startswith(query):
+                break
+            found.setdefault(idx, None)
+        if len(found) < limit:
+            for idx, path in enumerate(self.paths):
+                if query in path[-1].lower():
+                    found.setdefault(idx, None)
+        return [self.paths[idx] for idx in list(found)[:limit]]
+
+    def options(self, prefix):
+        """已知的下一级选项：prefix 为已选的上级名称，未采集过时返回空列表"""
+        options = []
+        for tree in self.trees:
+            node = tree
+            for name in prefix:
+                node = node.get("children", {}).get(name) if node else None
+            for option in (node or {}).get("options", []):
+                if option not in options:
+                    options.append(option)
+        return options
+
+    def filter_options(self, prefix, query):
+        """按前缀/首字母过滤下一级选项"""
+        query = query.strip().lower()
+        options = self.options(prefix)
+        if not query:
+            return options
+        return [o for o in options
+                if o.lower().startswith(query) or initials(o).startswith(query) or query in o.lower()]
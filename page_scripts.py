@@ -0,0 +1,86 @@
+"""
+页面例程注册表
+各模块把页面内例程（JS 函数表达式）按名称注册到这里，每个页面只安装一次：
+add_init_script 让之后的导航自动带上，当前文档再 evaluate 一次；
+之后每次调用只传例程名称和 JSON 参数，页面无需重复解析整段脚本
+"""
+
+import hashlib
+import weakref
+
+NAMESPACE = "__autoFill"
+
+# 调用已安装的例程；未安装或版本不一致时返回标记，由调用方安装后重试
+CALL_JS = r'''async ([ns, version, name, arg]) => {
+    const lib = window[ns];
+    if (!lib || lib.version !== version) return { __notInstalled: true };
+    return await lib.routines[name](arg);
+}'''
+
+
+class ScriptRegistry:
+    """按名称注册页面例程，按页面安装并调用"""
+
+    def __init__(self, namespace=NAMESPACE):
+        self.namespace = namespace
+        self.routines = {}  # {名称: JS 函数表达式}
+        self._version = None
+        self._source = None
+        self._installed = weakref.WeakKeyDictionary()  # {page: 已注册 init script 的版本}
+
+    def register(self, name, source):
+        """注册例程，source 为接收一个参数的 JS 函数表达式；返回 name 便于模块保存"""
+        self.routines[name] = source.strip()
+        self._version = None
+        self._source = None
+        return name
+
+    @property
+    def version(self):
+        if self._version is None:
+            digest = hashlib.sha1()
+            for name in sorted(self.routines):
+                digest.update(name.encode("utf-8"))
+                digest.update(self.routines[name].encode("utf-8"))
+            self._version = digest.hexdigest()[:12]
+        return self._version
+
+    def install_source(self):
+        """安装脚本：定义 window.__autoFill，已是同一版本时不重复定义"""
+        if self._source is None:
+            entries = ",\n".join(f"        {name}: {source}" for name, source in self.routines.items())
+            self._source = (
+                "(() => {\n"
+                f"    if (window.{self.namespace} && window.{self.namespace}.version === '{self.version}') return;\n"
+                f"    window.{self.namespace} = {{\n"
+                f"        version: '{self.version}',\n"
+                "        routines: {\n"
+                f"{entries}\n"
+                "        }\n"
+                "    };\n"
+                "})()"
+            )
+        return self._source
+
+    async def install(self, page):
+        """在页面安装全部例程（之后的导航由 init script 自动安装）"""
+        source = self.install_source()
+        if self._installed.get(page) != self.version:
+            await page.add_init_script(script=source)
+            self._installed[page] = self.version
+        await page.evaluate(source)
+
+    async def call(self, page, name, arg=None):
+        """调用页面例程，参数以 JSON 形式传入；页面尚未安装时先安装再调用"""
+        if name not in self.routines:
+            raise KeyError(f"未注册的页面例程: {name}")
+        call_args = [self.namespace, self.version, name, arg]
+        result = await page.evaluate(CALL_JS, call_args)
+        if isinstance(result, dict) and result.get("__notInstalled"):
+            await self.install(page)
+            result = await page.evaluate(CALL_JS, call_args)
+        return result
+
+
+# 全局注册表，各模块在导入时注册自己的例程
+SCRIPTS = ScriptRegistry()
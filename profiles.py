@@ -0,0 +1,96 @@
+"""
+银行表单识别
+连接时扫描一次表单结构（输入框数量、级联/下拉组件、标签文字）并计算布局指纹，
+先按 bank_configs 中记录过的指纹匹配，再按标签规则匹配，自动选择填写策略；
+无法匹配的新布局记录到 layout_captures.json，便于补充新的银行配置
+"""
+
+import time
+import threading
+
+from locator import SCAN_FIELDS, resolve_fields
+from fill_engine import wanted_fields
+from json_file import read_json, write_json_atomic
+from page_scripts import NAMESPACE, SCRIPTS
+
+DEFAULT_CAPTURE_FILE = "layout_captures.json"
+
+# 输入框列表和布局指纹直接调用已安装的字段扫描例程（与字段定位同一份），这里只补充组件数量
+PROFILE_SCAN_JS = r'''() => {
+    const scan = window.''' + NAMESPACE + r'''.routines.''' + SCAN_FIELDS + r'''();
+    return {
+        url: location.href,
+        fingerprint: scan.fingerprint,
+        fields: scan.fields,
+        cascader_count: document.querySelectorAll('.el-cascader').length,
+        select_count: document.querySelectorAll('.el-select').length,
+        date_count: document.querySelectorAll('.el-date-editor').length,
+        checkbox_count: document.querySelectorAll('.el-checkbox, input[type="checkbox"]').length
+    };
+}'''
+PROFILE_SCAN = SCRIPTS.register("profile_scan", PROFILE_SCAN_JS)
+
+
+def match_profile(scan, bank_configs):
+    """返回 (银行名称, 匹配方式, 字段定位)；无法唯一确定时银行名称为 None"""
+    fingerprint = scan["fingerprint"]
+    for bank, bank_config in bank_configs.items():
+        if fingerprint in bank_config.get("fingerprints", []):
+            return bank, "fingerprint", resolve_fields(scan["fields"], wanted_fields(bank_config))
+
+    # 标签规则：该银行需要的字段全部能按标签找到才算匹配
+    candidates = []
+    for bank, bank_config in bank_configs.items():
+        wanted = wanted_fields(bank_config)
+        field_map = resolve_fields(scan["fields"], wanted)
+        if wanted and not wanted - set(field_map):
+            candidates.append((bank, field_map))
+    if len(candidates) == 1:
+        bank, field_map = candidates[0]
+        return bank, "labels", field_map
+    return None, "unknown", {}
+
+
+class ProfileDetector:
+    """连接时识别页面所属的银行配置"""
+
+    def __init__(self, capture_path=DEFAULT_CAPTURE_FILE):
+        self.capture_path = capture_path
+        self._lock = threading.Lock()
+
+    async def detect(self, page, store):
+        """扫描页面并按配置存储 store 中的 bank_configs 匹配银行
+
+        返回 {"bank", "method", "fingerprint", "field_map", "scan"}；
+        按标签匹配成功时把指纹记入对应的 bank_configs[银行]["fingerprints"]（随配置自动保存），下次直接按指纹识别
+        """
+        scan = await SCRIPTS.call(page, PROFILE_SCAN)
+        bank, method, field_map = match_profile(scan, store.get("bank_configs", {}))
+        if bank and method == "labels":
+            with store.update("bank_configs") as bank_configs:
+                fingerprints = bank_configs[bank].setdefault("fingerprints", [])
+                if scan["fingerprint"] not in fingerprints:
+                    fingerprints.append(scan["fingerprint"])
+        elif bank is None and scan["fields"]:
+            self.capture(scan)
+        return {
+            "bank": bank,
+            "method": method,
+            "fingerprint": scan["fingerprint"],
+            "field_map": field_map,
+            "scan": scan,
+        }
+
+    def capture(self, scan):
+        """记录未知布局，供人工补充新的银行配置"""
+        if not self.capture_path:
+            return
+        with self._lock:
+            captures = read_json(self.capture_path, {})
+            entry = dict(scan)
+            entry["captured_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            captures[scan["fingerprint"]] = entry
+            try:
+                write_json_atomic(self.capture_path, captures)
+            except OSError:
+                pass
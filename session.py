@@ -0,0 +1,92 @@
+"""
+会话调度
+所有窗口的连接、填写、断开都作为协程在同一个后台事件循环中并发执行，
+用 asyncio.gather 汇总结果，支持整体取消和按用户取消，结果通过回调交还给调用方（如 Tk 主线程）
+"""
+
+import asyncio
+from contextlib import contextmanager
+
+
+class SessionOrchestrator:
+    """在后台事件循环中调度多窗口任务"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.tasks = set()
+        self.keyed = {}  # {key: 以该 key 登记的进行中任务}
+
+    def submit(self, coro, on_done=None, on_error=None):
+        """从任意线程提交协程，完成后在事件循环线程中回调 on_done(result) 或 on_error(exc)"""
+        future = asyncio.run_coroutine_threadsafe(self._track(coro), self.loop)
+
+        def _done(fut):
+            if fut.cancelled():
+                return
+            exc = fut.exception()
+            if exc is not None:
+                if on_error:
+                    on_error(exc)
+            elif on_done:
+                on_done(fut.result())
+
+        future.add_done_callback(_done)
+        return future
+
+    async def _track(self, coro):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            return await coro
+        finally:
+            self.tasks.discard(task)
+
+    async def gather(self, jobs):
+        """并发执行 {key: 协程}，返回 {key: 结果或异常}
+
+        任一任务出错不影响其它任务；本协程被取消时一并取消所有子任务并等待其结束
+        """
+        if not jobs:
+            return {}
+        keys = list(jobs.keys())
+        tasks = [asyncio.ensure_future(jobs[key]) for key in keys]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return dict(zip(keys, results))
+
+    @contextmanager
+    def track(self, key):
+        """把当前任务登记到 key（如用户编号）下，代码块结束时注销；须在事件循环线程中使用"""
+        task = asyncio.current_task()
+        self.keyed.setdefault(key, set()).add(task)
+        try:
+            yield task
+        finally:
+            tasks = self.keyed.get(key)
+            if tasks is not None:
+                tasks.discard(task)
+                if not tasks:
+                    del self.keyed[key]
+
+    def running(self, key):
+        """key 下是否有进行中的任务"""
+        return bool(self.keyed.get(key))
+
+    def cancel(self, key):
+        """只取消 key 下的任务，其它任务不受影响（可在任意线程调用）"""
+        def _cancel():
+            for task in list(self.keyed.get(key, ())):
+                task.cancel()
+        self.loop.call_soon_threadsafe(_cancel)
+
+    def cancel_all(self):
+        """取消所有进行中的任务（可在任意线程调用）"""
+        def _cancel():
+            for task in list(self.tasks):
+                task.cancel()
+        self.loop.call_soon_threadsafe(_cancel)
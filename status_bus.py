@@ -0,0 +1,136 @@
+"""
+状态总线
+后台连接/填写流程在任意线程发布用户状态变化，由 Tk 主循环定时取出，
+每个周期把这一批变化一次性分发给订阅者（用户列表、耗时面板、日志、状态文件）
+"""
+
+import time
+import queue
+import threading
+
+from json_file import write_json_atomic
+
+DEFAULT_INTERVAL_MS = 50
+
+
+class StatusBus:
+    """线程安全的状态发布 + 主线程批量分发
+
+    call_soon 把界面操作（切换控件、弹出对话框）交给同一个分发周期在主线程执行；
+    订阅者或回调出错时调用 on_error(异常)（主线程），不影响其余订阅者
+    """
+
+    def __init__(self, window, interval_ms=DEFAULT_INTERVAL_MS, on_error=None):
+        self.window = window
+        self.interval_ms = interval_ms
+        self.on_error = on_error
+        self.queue = queue.SimpleQueue()
+        self.calls = queue.SimpleQueue()
+        self.current = {}  # {user_id: 最新状态事件}，只在主线程读写
+        self._subscribers = []
+        self._after_id = None
+
+    def publish(self, user_id, status, **detail):
+        """发布一次状态变化，可在任意线程调用"""
+        self.queue.put({"user_id": user_id, "status": status, "time": time.time(), **detail})
+
+    def call_soon(self, func):
+        """在主线程下一个分发周期调用 func()（在状态分发之后），可在任意线程调用"""
+        self.calls.put(func)
+
+    def subscribe(self, callback):
+        """订阅状态变化，callback(events) 在主线程中按批调用，events 按发生顺序排列；返回取消订阅函数"""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def start(self):
+        """开始定时分发"""
+        if self._after_id is None:
+            self._after_id = self.window.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """停止定时分发，并分发剩余的状态变化"""
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        self._flush()
+
+    def _tick(self):
+        self._flush()
+        self._after_id = self.window.after(self.interval_ms, self._tick)
+
+    def _flush(self):
+        events = []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if events:
+            for event in events:
+                self.current[event["user_id"]] = event
+            for callback in list(self._subscribers):
+                try:
+                    callback(events)
+                except Exception as e:
+                    self._report(e)
+        while True:
+            try:
+                func = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func()
+            except Exception as e:
+                self._report(e)
+
+    def _report(self, error):
+        if self.on_error:
+            try:
+                self.on_error(error)
+            except Exception:
+                pass
+
+    def forget(self, user_id):
+        """用户删除后丢弃其状态（主线程调用）"""
+        self.current.pop(user_id, None)
+
+
+def latest_by_user(events):
+    """一批事件中每个用户的最后一个状态"""
+    latest = {}
+    for event in events:
+        latest[event["user_id"]] = event
+    return latest
+
+
+class StatusFileWriter:
+    """把当前所有用户状态写成 JSON 文件（供外部脚本监控），写盘在后台线程中合并进行"""
+
+    def __init__(self, bus, path):
+        self.bus = bus
+        self.path = path
+        self._pending = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __call__(self, events):
+        self._pending.put(dict(self.bus.current))
+
+    def _run(self):
+        while True:
+            snapshot = self._pending.get()
+            # 只写最新的一份快照
+            while True:
+                try:
+                    snapshot = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                write_json_atomic(self.path, {"updated_at": time.time(), "users": snapshot})
+            except OSError:
+                pass
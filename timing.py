@@ -0,0 +1,124 @@
+"""
+填写耗时记录
+Python 侧用 span 记录连接、往返等阶段，页面内例程返回的每一步耗时按偏移合并进同一条时间线，
+可选合并 CDP 采集的接口请求，并在与之重叠的页面步骤上标注服务端等待时间，
+每个用户保留最近一次填写的时间线，可导出为 JSON
+"""
+
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from net_timing import short_url
+
+
+class FillTimeline:
+    """一次填写的时间线，所有时间均为相对开始时刻的毫秒数"""
+
+    def __init__(self, user_name):
+        self.user_name = user_name
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+
+    def now_ms(self):
+        return (time.perf_counter() - self._origin) * 1000
+
+    def add(self, name, start_ms, duration_ms, source="python", ok=True, detail=None):
+        span = {
+            "name": name,
+            "source": source,
+            "start_ms": round(start_ms, 1),
+            "duration_ms": round(duration_ms, 1),
+            "ok": ok,
+        }
+        if detail:
+            span["detail"] = detail
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, detail=None):
+        """记录一段 Python 侧耗时，代码块抛出异常时标记为失败"""
+        start_ms = self.now_ms()
+        span = self.add(name, start_ms, 0, detail=detail)
+        try:
+            yield span
+        except BaseException:
+            span["ok"] = False
+            raise
+        finally:
+            span["duration_ms"] = round(self.now_ms() - start_ms, 1)
+
+    def add_page_steps(self, result, offset_ms=0):
+        """合并页面内例程返回的步骤耗时
+
+        按结果中的 started_at（最后一次执行填写计划时的墙上时间）对齐；之前的重新定位、重试等
+        不会把步骤挤到时间线前面。没有 started_at 时退回 offset_ms（发起调用的时刻）
+        """
+        if result.get("started_at"):
+            offset_ms = result["started_at"] - self.started_at * 1000
+        for step in result.get("steps", []):
+            step_start = offset_ms + step.get("start_ms", 0)
+            self.add(step.get("name", step.get("type")), step_start, step.get("ms", 0),
+                     source="page", ok=step.get("ok", False))
+            for level in step.get("levels", []) + step.get("targets", []):
+                self.add(f"  {level.get('text', '')}", offset_ms + level.get("start_ms", 0),
+                         level.get("ms", 0), source="page", ok=level.get("ok", True))
+
+    def add_network(self, requests):
+        """合并 NetworkCollector 记录的请求（按墙上时间换算偏移），
+        与请求时间重叠的页面步骤在 detail 中记录 server_ms（首字节时间合计）和 requests（请求数）"""
+        network = []
+        for request in requests:
+            start_ms = (request["wall_time"] - self.started_at) * 1000
+            duration = request["duration_ms"] or 0
+            detail = {"status": request["status"], "ttfb_ms": request["ttfb_ms"], "size": request["size"]}
+            if request["pending"]:
+                detail["pending"] = True
+            network.append(self.add(f"🌐 {request['method']} {short_url(request['url'])}", start_ms, duration,
+                                    source="network", ok=request["ok"] or request["pending"], detail=detail))
+        for span in self.spans:
+            if span["source"] != "page":
+                continue
+            end_ms = span["start_ms"] + span["duration_ms"]
+            overlapping = [n for n in network
+                           if n["start_ms"] < end_ms and n["start_ms"] + n["duration_ms"] > span["start_ms"]]
+            if overlapping:
+                detail = span.setdefault("detail", {})
+                detail["server_ms"] = round(sum(n["detail"]["ttfb_ms"] or 0 for n in overlapping), 1)
+                detail["requests"] = len(overlapping)
+
+    def total_ms(self):
+        if not self.spans:
+            return 0.0
+        return max(s["start_ms"] + s["duration_ms"] for s in self.spans)
+
+    def to_dict(self):
+        return {
+            "user": self.user_name,
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "total_ms": round(self.total_ms(), 1),
+            "spans": list(self.spans),
+        }
+
+
+class TimingRecorder:
+    """按用户保存最近一次填写的时间线（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timelines = {}
+
+    def record(self, key, timeline):
+        with self._lock:
+            self.timelines[key] = timeline
+
+    def snapshot(self):
+        with self._lock:
+            return {key: tl.to_dict() for key, tl in self.timelines.items()}
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(list(self.snapshot().values()), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,117 @@
+"""
+填写核对
+填写完成后一次 evaluate 读回整张表单（每个输入框的值、复选框状态），
+与填写计划中的期望值逐项比对，得出每个用户的核对结论，不再依赖各步骤写入时的自检和日志
+"""
+
+import re
+
+from locator import FINGERPRINT_JS
+from page_scripts import SCRIPTS
+
+# 页面内读取表单快照：文本输入框按索引（与填写计划一致），复选框按出现顺序
+SNAPSHOT_JS = r'''() => {
+''' + FINGERPRINT_JS + r'''
+    const inputs = [];
+    document.querySelectorAll('input.el-input__inner[type="text"]').forEach((input, index) => {
+        inputs.push({ index: index, label: fieldLabel(input), value: input.value });
+    });
+    const checkboxes = [];
+    document.querySelectorAll('input[type="checkbox"]').forEach(input => {
+        const box = input.closest('.el-checkbox');
+        const label = box && box.querySelector('.el-checkbox__label');
+        checkboxes.push({
+            label: (label || box || input).textContent.trim().slice(0, 20),
+            checked: input.checked || (!!box && box.classList.contains('is-checked'))
+        });
+    });
+    return { url: location.href, inputs: inputs, checkboxes: checkboxes };
+}'''
+SNAPSHOT = SCRIPTS.register("snapshot", SNAPSHOT_JS)
+
+
+def date_parts(text):
+    """日期显示值中的 (年, 月, 日)，兼容 2026-01-20 / 2026/1/20 / 2026年1月20日"""
+    parts = [int(p) for p in re.findall(r"\d+", text or "")]
+    return tuple(parts[:3]) if len(parts) >= 3 else None
+
+
+def expected_values(plan, result=None):
+    """由填写计划（和填写结果）得出每个输入框的期望值，返回 [{"label", "index", "value", "kind"}]
+
+    级联按页面内实际选中的名称核对（配置名称可能只是其中一部分）
+    """
+    executed = {step.get("type"): step for step in (result or {}).get("steps", [])}
+    expected = []
+    for step in plan["steps"]:
+        kind = step["type"]
+        if kind == "inputs":
+            for field in step["fields"]:
+                expected.append({"label": field["label"], "index": field["index"], "value": field["value"], "kind": "text"})
+        elif kind == "cascade":
+            levels = executed.get("cascade", {}).get("levels", [])
+            for level, wanted in enumerate(step["path"]):
+                chosen = levels[level] if level < len(levels) else {}
+                value = chosen.get("text", wanted) if chosen.get("ok", True) else wanted
+                expected.append({"label": f"网点第{level + 1}级", "index": step["start_index"] + level,
+                                 "value": value, "kind": "text"})
+        elif kind == "date":
+            expected.append({"label": step["name"], "index": step["index"], "value": step["date"], "kind": "date"})
+        elif kind == "selects":
+            for target in step["targets"]:
+                if target.get("value"):
+                    expected.append({"label": target["label"], "index": target["index"],
+                                     "value": target["value"], "kind": "text"})
+        elif kind == "checkboxes":
+            expected.append({"label": step["name"], "index": None, "value": True, "kind": "checkboxes"})
+    return expected
+
+
+def diff_snapshot(snapshot, expected):
+    """逐项比对快照与期望值，返回 (一致项数, 不一致列表 [{"label", "expected", "actual"}])"""
+    inputs = {item["index"]: item for item in snapshot.get("inputs", [])}
+    matched, mismatches = 0, []
+    for item in expected:
+        if item["kind"] == "checkboxes":
+            unchecked = [box["label"] for box in snapshot.get("checkboxes", []) if not box["checked"]]
+            if unchecked:
+                mismatches.append({"label": item["label"], "expected": "全部勾选",
+                                   "actual": "未勾选: " + ", ".join(unchecked)})
+            else:
+                matched += 1
+            continue
+        field = inputs.get(item["index"])
+        if field is None:
+            mismatches.append({"label": item["label"], "expected": item["value"], "actual": "未找到输入框"})
+            continue
+        actual = field["value"]
+        if item["kind"] == "date":
+            same = date_parts(actual) is not None and date_parts(actual) == date_parts(item["value"])
+        else:
+            same = actual == item["value"]
+        if same:
+            matched += 1
+        else:
+            mismatches.append({"label": item["label"], "expected": item["value"], "actual": actual or "(空)"})
+    return matched, mismatches
+
+
+async def verify_fill(page, plan, result=None):
+    """一次往返读回表单并与填写计划比对，返回核对结论
+
+    {"ok": 全部一致, "matched": 一致项数, "total": 核对项数, "mismatches": [...]}
+    """
+    snapshot = await SCRIPTS.call(page, SNAPSHOT)
+    expected = expected_values(plan, result)
+    matched, mismatches = diff_snapshot(snapshot, expected)
+    return {"ok": not mismatches, "matched": matched, "total": len(expected), "mismatches": mismatches}
+
+
+def format_verdict(verification):
+    """核对结论整理为日志行：第一行为一句话结论，其后每个不一致项一行"""
+    if verification["ok"]:
+        return [f"🔍 核对通过: {verification['matched']}/{verification['total']} 项一致"]
+    lines = [f"🔍 核对未通过: {len(verification['mismatches'])}/{verification['total']} 项不一致"]
+    for item in verification["mismatches"]:
+        lines.append(f"    {item['label']}: 期望 {item['expected']}，实际 {item['actual']}")
+    return lines